@@ -0,0 +1,63 @@
+import argparse
+import threading
+from pathlib import Path
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # /items/123 -> items/123.html, /baki/alqi-satqi/menziller?page=2 -> baki/alqi-satqi/menziller/page-2.html
+    def translate_path(self, path):
+        parts = urlsplit(path)
+        page = parse_qs(parts.query).get("page")
+        local = parts.path.rstrip("/")
+        if page:
+            local = f"{local}/page-{page[0]}"
+        if not Path(local).suffix:
+            local = f"{local}.html"
+        return super().translate_path(local)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, directory=FIXTURES_DIR) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), partial(FixtureHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def write_links(server: ThreadingHTTPServer, path, directory=FIXTURES_DIR) -> int:
+    items = sorted((Path(directory) / "items").glob("*.html"))
+    with open(path, "w", encoding="utf-8") as file:
+        for item in items:
+            file.write(f"{base_url(server)}/items/{item.stem}\n")
+    return len(items)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve saved bina.az pages for offline scraper runs.")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--directory", default=str(FIXTURES_DIR))
+    parser.add_argument("--write-links", help="write the URLs of all fixture listings to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = start_server(port=args.port, directory=args.directory)
+    if args.write_links:
+        print(f"Wrote {write_links(server, args.write_links, args.directory)} links to {args.write_links}")
+    print(f"Serving {args.directory} at {base_url(server)}, Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,51 +1,151 @@
+import os
+import json
 import time
+import argparse
+import requests
 from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from pathlib import Path
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor
 
-chrome_options = Options()
-chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+BASE_URL = "https://bina.az"
+INDEX_PATH = "/baki/alqi-satqi/menziller"
+ITEMS_XPATH = '//*[@id="js-items-search"]/div[contains(concat(" ", normalize-space(@class), " "), " items_list ")]//a/@href'
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "az,en;q=0.8",
+}
 
-driver = webdriver.Chrome(options=chrome_options)
-driver.maximize_window()
-wait = WebDriverWait(driver, 10)
 
-all_hrefs = set()
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
 
-for page in tqdm(range(1, 566), desc="Gathering links"):
-    try:
-        driver.get(f"https://bina.az/baki/alqi-satqi/menziller?page={page}")
-        driver.execute_script("window.scrollBy(0, 2000);")
-        time.sleep(1)
 
-        items_list = None
-        for _ in range(3):
+def parse_item_links(content: bytes, page_url: str) -> list:
+    links = []
+    for href in lxml_html.fromstring(content).xpath(ITEMS_XPATH):
+        parts = urlsplit(urljoin(page_url, href))
+        if parts.path.startswith("/items/"):
+            links.append(urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")))
+    return list(dict.fromkeys(links))
+
+
+class Checkpoint:
+    def __init__(self, links_path: Path):
+        self.links_path = links_path
+        self.state_path = links_path.with_name(f"{links_path.name}.state.json")
+        self.links = set()
+        self.pages_done = set()
+
+        if links_path.exists():
+            with open(links_path, "r", encoding="utf-8") as file:
+                self.links = {line.strip() for line in file if line.strip()}
+        if self.state_path.exists():
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                self.pages_done = set(json.load(file)["pages_done"])
+
+    def add(self, page: int, links: list) -> list:
+        new_links = [link for link in links if link not in self.links]
+        if new_links:
+            with open(self.links_path, "a", encoding="utf-8") as file:
+                file.writelines(link + "\n" for link in new_links)
+            self.links.update(new_links)
+        self.pages_done.add(page)
+        return new_links
+
+    def clear(self):
+        # Page numbers shift as listings are posted, so page state only holds within one run.
+        self.pages_done = set()
+        self.state_path.unlink(missing_ok=True)
+
+    def save(self):
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"pages_done": sorted(self.pages_done), "links": len(self.links)}, file)
+        os.replace(tmp_path, self.state_path)
+
+
+class LinkHarvester:
+    def __init__(self, base_url: str = BASE_URL, concurrency: int = 8, retries: int = 3, timeout: float = 20.0):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.session = make_session(concurrency)
+
+    def page_url(self, page: int) -> str:
+        return f"{self.base_url}{INDEX_PATH}?page={page}"
+
+    def fetch_page(self, page: int):
+        url = self.page_url(page)
+        for attempt in range(self.retries + 1):
             try:
-                items_list = wait.until(EC.visibility_of_element_located(
-                    (By.CSS_SELECTOR, "#js-items-search > div.items_list")))
-                break
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                return page, parse_item_links(response.content, url)
             except Exception as e:
-                print(f"ERROR: {e}. Trying again...")
-                time.sleep(1)
-                continue
+                if attempt == self.retries:
+                    print(f"ERROR: page {page}: {e}")
+                    return page, None
+                time.sleep(2 ** attempt)
+
+    def harvest(self, pages: list, checkpoint: Checkpoint, incremental: bool = False) -> int:
+        added = 0
+        with ThreadPoolExecutor(self.concurrency) as pool, tqdm(total=len(pages), desc="Gathering links") as progress:
+            for start in range(0, len(pages), self.concurrency):
+                window = pages[start:start + self.concurrency]
+                reached_known = False
+                for page, links in pool.map(self.fetch_page, window):
+                    progress.update(1)
+                    if links is None:
+                        continue
+                    new_links = checkpoint.add(page, links)
+                    added += len(new_links)
+                    # Listings are newest first, so a page with nothing new means the rest is known.
+                    if incremental and links and not new_links:
+                        reached_known = True
+                checkpoint.save()
+                if reached_known:
+                    print(f"Reached already known links at page {window[-1]}, stopping")
+                    break
+        return added
+
 
-        if not items_list:
-            continue
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect listing links from the bina.az index pages.")
+    parser.add_argument("--output", default="ootlinks.txt")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--pages", type=int, default=565)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--incremental", action="store_true",
+                        help="crawl from page 1 and stop once a page has no new links")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip pages an interrupted run already finished")
+    return parser.parse_args()
 
-        links = items_list.find_elements(By.TAG_NAME, "a")
-        hrefs = {link.get_attribute("href") for link in links if link.get_attribute("href") and 
-                 link.get_attribute("href").startswith("https://bina.az/items/")}
-        all_hrefs.update(hrefs)
 
-    except Exception as e:
-        print(f"ERROR: {e}")
-        continue
+if __name__ == "__main__":
+    args = parse_args()
+    checkpoint = Checkpoint(Path(args.output))
+    if not args.resume:
+        checkpoint.clear()
+    pages = [page for page in range(1, args.pages + 1) if page not in checkpoint.pages_done]
+    print(f"{len(checkpoint.links)} links known, {len(pages)} pages to crawl")
 
-driver.quit()
+    harvester = LinkHarvester(args.base_url, args.concurrency, args.retries)
+    added = harvester.harvest(pages, checkpoint, incremental=args.incremental)
+    print(f"Added {added} links, {len(checkpoint.links)} total in {args.output}")
 
-with open("ootlinks.txt", "w", encoding="utf-8") as file:
-    for href in all_hrefs:
-        file.write(href + "\n")
\ No newline at end of file
+    failed = [page for page in pages if page not in checkpoint.pages_done]
+    if args.incremental or not failed:
+        checkpoint.clear()
+    else:
+        print(f"{len(failed)} pages failed, run again with --resume to retry them")
@@ -1,62 +1,191 @@
-import os 
-import time
+import os
 import json
-
+import time
+import random
+import asyncio
+import argparse
 import warnings
 warnings.filterwarnings("ignore")
 
 from tqdm import tqdm
-from playwright.sync_api import sync_playwright
-
-scraped_data = []
-error_count = 0
-
-with open("ootlinks.txt", "r") as file:
-    links = [link.strip() for link in file.readlines()]
-
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=True)
-    page = browser.new_page()
-    
-    for link in tqdm(links, desc="Scraping Links"):
-        one_data = {}
-        
-        try:
-            page.goto(link)
-            page.wait_for_selector("#js-search-results > div.page-content > div.product.bz-container.bz-mb-15 > div > main > section:nth-child(3) > div > div")
-            price = page.locator("#js-search-results > div.page-content > div.product.bz-container.bz-mb-15 > div > aside > div > div.product-sidebar__box > div.product-price > div.product-price__i.product-price__i--bold > span.price-val").text_content()
-            address = page.locator("#js-search-results > div.page-content > div.product-heading-container > div > div > div.product-heading__left.bz-d-flex.bz-align-center > h1").text_content().split(", ")[-1]
-            error_count = 0
-        
-            latlong = page.locator("#item_map")
-            lat = latlong.get_attribute('data-lat')
-            lng = latlong.get_attribute('data-lng')
-
-            one_data["latitude"] = lat
-            one_data["longitude"] = lng
-            one_data["price"] = price
-            one_data["address"] = address
-            
-            detail_names = page.locator(".product-properties__i-name").all_text_contents()
-            detail_values = page.locator(".product-properties__i-value").all_text_contents()
-
-            for name, value in zip(detail_names, detail_values):
-                key = name.strip().lower()
-                one_data[key] = value.strip().lower()
-
-            scraped_data.append(one_data)
-
-        except:
-            error_count += 1
-            if error_count > 3:
-                break
-            else:
-                time.sleep(5)
+from pathlib import Path
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+
+CONTENT_SELECTOR = "#js-search-results > div.page-content > div.product.bz-container.bz-mb-15 > div > main > section:nth-child(3) > div > div"
+PRICE_SELECTOR = "#js-search-results > div.page-content > div.product.bz-container.bz-mb-15 > div > aside > div > div.product-sidebar__box > div.product-price > div.product-price__i.product-price__i--bold > span.price-val"
+ADDRESS_SELECTOR = "#js-search-results > div.page-content > div.product-heading-container > div > div > div.product-heading__left.bz-d-flex.bz-align-center > h1"
+MAP_SELECTOR = "#item_map"
+BLOCKED_RESOURCES = {"image", "media", "font"}
+
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_slot = {}
+        self.locks = {}
+
+    async def wait(self, url: str):
+        host = urlparse(url).netloc
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+class ResultWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_done(path: Path) -> set:
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                done.add(json.loads(line)["url"])
+            except (json.JSONDecodeError, KeyError):
                 continue
+    return done
+
+
+async def scrape_listing(page, link: str, timeout: float) -> dict:
+    await page.goto(link, timeout=timeout)
+    await page.wait_for_selector(CONTENT_SELECTOR, timeout=timeout)
+
+    one_data = {"url": link}
+    one_data["price"] = await page.locator(PRICE_SELECTOR).text_content()
+    one_data["address"] = (await page.locator(ADDRESS_SELECTOR).text_content()).split(", ")[-1]
+
+    latlong = page.locator(MAP_SELECTOR)
+    one_data["latitude"] = await latlong.get_attribute("data-lat")
+    one_data["longitude"] = await latlong.get_attribute("data-lng")
+
+    detail_names = await page.locator(".product-properties__i-name").all_text_contents()
+    detail_values = await page.locator(".product-properties__i-value").all_text_contents()
+    for name, value in zip(detail_names, detail_values):
+        one_data[name.strip().lower()] = value.strip().lower()
+
+    return one_data
+
+
+class Scraper:
+    def __init__(self, concurrency: int = 4, rate: float = 2.0, retries: int = 3, backoff: float = 2.0,
+                 timeout: float = 30.0, max_consecutive_failures: int = 10):
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout * 1000
+        self.max_consecutive_failures = max_consecutive_failures
+        self.consecutive_failures = 0
+        self.failed = []
+
+    async def _fetch(self, page, link: str):
+        for attempt in range(self.retries + 1):
+            await self.limiter.wait(link)
+            try:
+                return await scrape_listing(page, link, self.timeout)
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"ERROR: {link}: {e}")
+                    return None
+                await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    async def _worker(self, page, queue: asyncio.Queue, writer: ResultWriter, progress, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                link = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            record = await self._fetch(page, link)
+            if record is None:
+                self.failed.append(link)
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.max_consecutive_failures:
+                    print(f"{self.consecutive_failures} failures in a row, stopping")
+                    stop.set()
+            else:
+                self.consecutive_failures = 0
+                writer.write(record)
+            progress.update(1)
+
+    async def run(self, links: list, output: Path, headless: bool = True):
+        queue = asyncio.Queue()
+        for link in links:
+            queue.put_nowait(link)
+
+        writer = ResultWriter(output)
+        stop = asyncio.Event()
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            contexts = [await browser.new_context() for _ in range(self.concurrency)]
+            pages = []
+            for context in contexts:
+                await context.route("**/*", self._route)
+                pages.append(await context.new_page())
+
+            try:
+                with tqdm(total=len(links), desc="Scraping Links") as progress:
+                    await asyncio.gather(*(self._worker(page, queue, writer, progress, stop) for page in pages))
+            finally:
+                writer.close()
+                await browser.close()
+
+        return self.failed
+
+    @staticmethod
+    async def _route(route):
+        if route.request.resource_type in BLOCKED_RESOURCES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape listing pages concurrently into a JSONL file.")
+    parser.add_argument("--links", default="ootlinks.txt")
+    parser.add_argument("--output", default="./data/ootdata.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="browser contexts scraping in parallel")
+    parser.add_argument("--rate", type=float, default=2.0, help="max requests per second per host (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=2.0, help="base seconds for exponential backoff")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds per page load")
+    parser.add_argument("--max-consecutive-failures", type=int, default=10)
+    parser.add_argument("--headful", action="store_true")
+    parser.add_argument("--shutdown", action="store_true", help="power off the machine when done")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = Path(args.output)
 
-    with open('./data/ootdata.json', 'w', encoding="utf-8") as f:
-        json.dump(scraped_data, f, indent=0)
+    with open(args.links, "r") as file:
+        links = list(dict.fromkeys(link.strip() for link in file if link.strip()))
+    done = read_done(output)
+    pending = [link for link in links if link not in done]
+    print(f"{len(done)} already scraped, {len(pending)} to go")
 
-    browser.close()
+    scraper = Scraper(args.concurrency, args.rate, args.retries, args.backoff, args.timeout,
+                      args.max_consecutive_failures)
+    failed = asyncio.run(scraper.run(pending, output, headless=not args.headful))
+    if failed:
+        print(f"{len(failed)} links failed, rerun to retry them")
 
-os.system("shutdown /s /f /t 0")
\ No newline at end of file
+    if args.shutdown:
+        os.system("shutdown /s /f /t 0")
@@ -0,0 +1,91 @@
+"""HTTP prediction service."""
+import os
+from typing import Literal
+import metrics
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+from registry import open_predictor
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+from georeference import LATITUDE_BOUNDS, LONGITUDE_BOUNDS
+
+MODEL_PATH = os.environ.get("HPP_MODEL_PATH", "./models/bundle")
+GRID_PATH = os.environ.get("HPP_GEOGRID_PATH")
+MAX_BATCH_SIZE = 10000
+
+
+class Listing(BaseModel):
+    address: str = Field(min_length=1)
+    latitude: float = Field(ge=LATITUDE_BOUNDS[0], le=LATITUDE_BOUNDS[1])
+    longitude: float = Field(ge=LONGITUDE_BOUNDS[0], le=LONGITUDE_BOUNDS[1])
+    area: float = Field(gt=0)
+    rooms: int = Field(gt=0)
+    floor: int = Field(gt=0)
+    max_floor: int = Field(gt=0)
+    category: Literal[0, 1]
+    repaired: Literal[0, 1]
+
+    @model_validator(mode="after")
+    def check_floors(self):
+        if self.max_floor < self.floor:
+            raise ValueError("max_floor must be greater than or equal to floor")
+        return self
+
+
+class BatchRequest(BaseModel):
+    listings: list[Listing] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class Prediction(BaseModel):
+    price: float
+    lower_bound: float
+    upper_bound: float
+
+
+class BatchPrediction(BaseModel):
+    predictions: list[Prediction]
+
+
+def to_prediction(price: float, lower: float, upper: float) -> Prediction:
+    return Prediction(price=round(price), lower_bound=round(lower), upper_bound=round(upper))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up before accepting traffic so the first request doesn't pay for lazy imports.
+    app.state.predictor = await run_in_threadpool(lambda: open_predictor(MODEL_PATH, grid_path=GRID_PATH).warmup())
+    yield
+    if hasattr(app.state.predictor, "close"):
+        app.state.predictor.close()
+
+
+app = FastAPI(title="Flat Price Prediction", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health(request: Request):
+    return {"status": "ok", "model_version": request.app.state.predictor.version}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/predict", response_model=Prediction)
+async def predict(listing: Listing, request: Request):
+    metrics.REGISTRY.inc("hpp_requests_total", help="Prediction requests per endpoint.", endpoint="/predict")
+    price, lower, upper = await run_in_threadpool(request.app.state.predictor.predict_with_interval,
+                                                  listing.model_dump())
+    return to_prediction(float(price), lower, upper)
+
+
+@app.post("/predict/batch", response_model=BatchPrediction)
+async def predict_batch(batch: BatchRequest, request: Request):
+    metrics.REGISTRY.inc("hpp_requests_total", help="Prediction requests per endpoint.", endpoint="/predict/batch")
+    metrics.REGISTRY.inc("hpp_batch_rows_total", len(batch.listings), help="Listings scored through /predict/batch.")
+    rows = [listing.model_dump() for listing in batch.listings]
+    prices, lower, upper = await run_in_threadpool(request.app.state.predictor.predict_many_with_intervals, rows)
+    return BatchPrediction(predictions=[to_prediction(price, low, high)
+                                        for price, low, high in zip(prices.tolist(), lower.tolist(), upper.tolist())])
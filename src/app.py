@@ -1,13 +1,55 @@
-import folium
+import os
+import time
+import metrics
+import comparables
+import pandas as pd
 import streamlit as st
-from predict import Predictor
-from streamlit_folium import st_folium
+from concurrent.futures import Future
+from predict import load_in_background
+from registry import open_predictor
+from cache import PredictionCache
+from georeference import LATITUDE_BOUNDS, LONGITUDE_BOUNDS
 
-model_path = "./models/model.pkl"
-predictor = Predictor(model_path)
+model_path = os.environ.get("HPP_MODEL_PATH", "./models/bundle")
+grid_path = os.environ.get("HPP_GEOGRID_PATH")
+comparables_path = os.environ.get("HPP_COMPARABLES_PATH", str(comparables.INDEX_PATH))
+rerun_started = time.perf_counter()
 
 st.set_page_config(layout="wide", page_title="Flat Price Prediction")
 
+@st.cache_resource
+def start_metrics_server():
+    return metrics.serve_from_env()
+
+@st.cache_resource
+def load_predictor(path: str, grid_path: str = None) -> Future:
+    # The model loads and warms up on a background thread while the form renders.
+    return load_in_background(path, factory=open_predictor, grid_path=grid_path)
+
+@st.cache_resource(max_entries=1)
+def load_comparables(path: str, stamp: int) -> Future:
+    # Keyed by the index's meta.json mtime, so inserted scrape batches show up on the next rerun.
+    return load_in_background(path, factory=comparables.ComparablesIndex)
+
+@st.cache_resource
+def load_prediction_cache() -> PredictionCache:
+    return PredictionCache()
+
+@st.cache_data(max_entries=8)
+def load_heatmap(name: str, stamp: int):
+    # stamp is the overlay's file mtime, so a regenerated overlay is read again.
+    import base64
+    import heatmap
+
+    png, meta = heatmap.load_overlay(name)
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii"), meta
+
+start_metrics_server()
+predictor_future = load_predictor(model_path, grid_path)
+prediction_cache = load_prediction_cache()
+comparables_stamp = comparables.stamp(comparables_path)
+comparables_future = load_comparables(comparables_path, comparables_stamp) if comparables_stamp else None
+
 if 'map_lat' not in st.session_state:
     st.session_state['map_lat'] = ""
 if 'map_lon' not in st.session_state:
@@ -18,7 +60,7 @@ def make_prediction():
 
     try:
         lat_value = float(st.session_state.get("lat_input", ""))
-        if not (40 <= lat_value <= 40.65):
+        if not (LATITUDE_BOUNDS[0] <= lat_value <= LATITUDE_BOUNDS[1]):
             st.error(f"Enlik {lat_value} Bakı sərhədlərindən kənardadır.")
             has_error = True
     except ValueError:
@@ -27,7 +69,7 @@ def make_prediction():
 
     try:
         lon_value = float(st.session_state.get("lon_input", ""))
-        if not (49.25 <= lon_value <= 50.5):
+        if not (LONGITUDE_BOUNDS[0] <= lon_value <= LONGITUDE_BOUNDS[1]):
             st.error(f"Uzunluq {lon_value} Bakı sərhədlərindən kənardadır.")
             has_error = True
     except ValueError:
@@ -86,13 +128,32 @@ def make_prediction():
             'repaired': st.session_state['repaired']
         }
         
-        predicted_price = predictor.predict(input_data)
-
-        lower_bound = round(predicted_price * (1 - 10 / 100))
-        upper_bound = round(predicted_price * (1 + 10 / 100))
+        with st.spinner("Model yüklənir..."):
+            predictor = predictor_future.result()
+        predicted_price, lower_bound, upper_bound = prediction_cache.get_or_compute(
+            input_data, predictor.predict_with_interval, predictor.version)
+        lower_bound, upper_bound = round(lower_bound), round(upper_bound)
 
         st.success(f"💸 Qiymət: {round(predicted_price):,} AZN")
-        st.success(f"📉 Təxmin edilən aralıq: {lower_bound:,} – {upper_bound:,} AZN")
+        coverage = f" ({predictor.intervals['coverage']:.0%})" if predictor.intervals else ""
+        st.success(f"📉 Təxmin edilən aralıq{coverage}: {lower_bound:,} – {upper_bound:,} AZN")
+
+        stats = prediction_cache.stats()
+        st.caption(f"Keş: {stats['hits']} hit / {stats['misses']} miss ({stats['size']} qeyd)")
+
+        if comparables_future is not None:
+            rows = comparables_future.result().query(input_data)
+            st.subheader("🏘️ Oxşar elanlar")
+            st.dataframe(pd.DataFrame({
+                "Ərazi": rows["address"],
+                "Sahə (m2)": rows["area"],
+                "Otaq sayı": rows["rooms"],
+                "Mərtəbə": rows["floor"].astype(str) + "/" + rows["max_floor"].astype(str),
+                "Kateqoriya": rows["category"].map({0: "Köhnə tikili", 1: "Yeni tikili"}),
+                "Təmir": rows["repaired"].map({0: "Təmirsiz", 1: "Təmirli"}),
+                "Qiymət (AZN)": rows["price"].map("{:,.0f}".format),
+                "Məsafə (m)": rows["distance_m"].astype(int),
+            }), hide_index=True, use_container_width=True)
 
 col1, col2 = st.columns([4, 2])
 
@@ -152,9 +213,25 @@ with col1:
 with col2:
     st.markdown("<div style='margin-top: 64px'></div>", unsafe_allow_html=True)
     st.subheader("🗺️ Xəritə")
+    # folium and streamlit_folium take over a second to import, so they load after the form is sent.
+    import folium
+    import heatmap
+    from streamlit_folium import st_folium
+
     m = folium.Map(location=[40.4093, 49.8671], zoom_start=10, tiles="OpenStreetMap")
     m.add_child(folium.LatLngPopup())
 
+    overlays = heatmap.available()
+    if overlays and st.checkbox("Qiymət xəritəsi"):
+        overlay = st.selectbox("Mənzil profili", options=overlays) if len(overlays) > 1 else overlays[0]
+        image_url, overlay_meta = load_heatmap(overlay, heatmap.stamp(overlay))
+        folium.raster_layers.ImageOverlay(image_url, bounds=overlay_meta["bounds"],
+                                          opacity=overlay_meta["opacity"]).add_to(m)
+        low, high = overlay_meta["price_range"]
+        folium.LinearColormap([color for _, color in overlay_meta["colors"]],
+                              index=[low + stop * (high - low) for stop, _ in overlay_meta["colors"]],
+                              vmin=low, vmax=high, caption="AZN").add_to(m)
+
     map_data = st_folium(m, width=360, height=360)
 
     if map_data and map_data.get("last_clicked"):
@@ -164,4 +241,7 @@ with col2:
         if lat != st.session_state.get('map_lat') or lon != st.session_state.get('map_lon'):
             st.session_state['map_lat'] = lat
             st.session_state['map_lon'] = lon
-            st.rerun()
\ No newline at end of file
+            metrics.observe("app.rerun", time.perf_counter() - rerun_started)
+            st.rerun()
+
+metrics.observe("app.rerun", time.perf_counter() - rerun_started)
\ No newline at end of file
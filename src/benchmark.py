@@ -0,0 +1,354 @@
+import sys
+import json
+import time
+import pickle
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from synthetic import SIZES, listings, parse_size, write_scrape
+
+SRC_DIR = Path(__file__).resolve().parent
+BUNDLE_PATH = "./models/bundle"
+RESULTS_DIR = Path("benchmarks")
+IO_FILES = ["./data/oot.xlsx", "./data/test.xlsx"]
+SINGLE_CALLS = 1000
+IMPORT_REPORT_TOP = 15
+REGRESSION_THRESHOLD = 0.10
+SAMPLE_INPUT = {
+    'address': 'Nəsimi M.', 'latitude': 40.42, 'longitude': 49.82, 'area': 60, 'rooms': 2,
+    'floor': 3, 'max_floor': 9, 'category': 1, 'repaired': 1,
+}
+
+STARTUP_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from predict import Predictor
+imported = time.perf_counter()
+predictor = Predictor({model!r})
+loaded = time.perf_counter()
+if {warm!r}:
+    predictor.warmup()
+warmed = time.perf_counter()
+predictor.predict({sample!r})
+predicted = time.perf_counter()
+print(json.dumps({{"import": imported - start, "load": loaded - imported, "warmup": warmed - loaded,
+                  "first_predict": predicted - warmed, "time_to_first_prediction": predicted - start}}))
+"""
+
+
+IO_SCRIPT = """
+import sys, json, time
+sys.path.insert(0, {src!r})
+from storage import read_frame, write_frame
+from stages import MB, PeakSampler, current_rss
+df = read_frame({source!r}) if {op!r} == "write" else None
+# Current RSS, not the ru_maxrss high-water mark, which loading the source frame already raised.
+base = current_rss()
+start = time.perf_counter()
+with PeakSampler() as sampler:
+    if {op!r} == "write":
+        write_frame(df, {path!r})
+    else:
+        result = read_frame({path!r}, memory_map={memory_map!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "peak_mb": (sampler.peak - base) / MB}}))
+"""
+
+
+CLEAN_SCRIPT = """
+import sys, json, time
+from pathlib import Path
+sys.path.insert(0, {src!r})
+from cleaning import DatasetCleaner
+from stages import MB, PeakSampler, current_rss
+base = current_rss()
+start = time.perf_counter()
+with PeakSampler() as sampler:
+    cleaner = DatasetCleaner({name!r})
+    cleaner.data_folder = Path({folder!r})
+    rows = len(cleaner.clean_all())
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "peak_mb": (sampler.peak - base) / MB, "rows": rows}}))
+"""
+
+def run_fresh(script: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs: list) -> dict:
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def time_call(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def throughput(seconds: list, rows: int) -> dict:
+    median = statistics.median(seconds)
+    return {"seconds": median, "rows_per_sec": rows / median}
+
+
+def import_report(script: str) -> list:
+    # Same fresh process under -X importtime; returns (module, self seconds, cumulative seconds, depth).
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True,
+                            check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6, depth))
+    return modules
+
+
+def print_import_report(modules: list, top: int = IMPORT_REPORT_TOP):
+    direct = sorted((module for module in modules if module[3] == 0), key=lambda module: -module[2])
+    print(f"Top-level imports by cumulative time ({sum(module[1] for module in modules):.3f}s importing in total)")
+    for name, _, cumulative, _ in direct[:top]:
+        print(f"  {name:<40} {cumulative:>8.4f}")
+    print("Slowest modules by self time")
+    for name, own, _, _ in sorted(modules, key=lambda module: -module[1])[:top]:
+        print(f"  {name:<40} {own:>8.4f}")
+
+
+def bench_startup(repeat: int, sizes: list) -> dict:
+    from bundle import load_bundle
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = Path(tmp) / "model.pkl"
+        with open(pickle_path, "wb") as file:
+            pickle.dump(load_bundle(BUNDLE_PATH).model, file)
+
+        variants = {
+            "pickle": (str(pickle_path), False),
+            "cbm": (BUNDLE_PATH, False),
+            "cbm+warmup": (BUNDLE_PATH, True),
+        }
+        results = {}
+        for name, (model, warm) in variants.items():
+            script = STARTUP_SCRIPT.format(src=str(SRC_DIR), model=model, warm=warm, sample=SAMPLE_INPUT)
+            results[name] = summarize([run_fresh(script) for _ in range(repeat)])
+        modules = import_report(STARTUP_SCRIPT.format(src=str(SRC_DIR), model=BUNDLE_PATH, warm=False,
+                                                      sample=SAMPLE_INPUT))
+
+    print(f"Cold start in fresh processes, median of {repeat} runs (seconds)")
+    print(f"{'variant':<11} {'import':>8} {'load':>8} {'warmup':>8} {'predict':>8} {'to first':>9}")
+    for name, stats in results.items():
+        print(f"{name:<11} {stats['import']:>8.4f} {stats['load']:>8.4f} {stats['warmup']:>8.4f} "
+              f"{stats['first_predict']:>8.4f} {stats['time_to_first_prediction']:>9.4f}")
+    print()
+    print_import_report(modules)
+    return results
+
+
+def bench_io(repeat: int, sizes: list) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in IO_FILES:
+            stem = Path(source).stem
+            targets = {suffix: str(Path(tmp) / f"{stem}{suffix}") for suffix in (".xlsx", ".parquet", ".feather")}
+            steps = [(f"write {suffix}", "write", path, False) for suffix, path in targets.items()]
+            steps += [(f"read {suffix}", "read", path, False) for suffix, path in targets.items()]
+            steps += [(f"read {suffix} mmap", "read", targets[suffix], True) for suffix in (".parquet", ".feather")]
+
+            results[stem] = {}
+            for name, op, path, memory_map in steps:
+                script = IO_SCRIPT.format(src=str(SRC_DIR), source=source, op=op, path=path, memory_map=memory_map)
+                results[stem][name] = summarize([run_fresh(script) for _ in range(repeat)])
+            for suffix, path in targets.items():
+                results[stem][f"size {suffix}"] = Path(path).stat().st_size / 2 ** 20
+
+    for stem, stats in results.items():
+        print(f"I/O for {stem}, median of {repeat} runs")
+        print(f"{'step':<22} {'seconds':>9} {'peak MB':>9}")
+        for name, value in stats.items():
+            if name.startswith("size"):
+                print(f"{name:<22} {value:>8.2f}M")
+            else:
+                print(f"{name:<22} {value['seconds']:>9.4f} {value['peak_mb']:>9.1f}")
+    return results
+
+
+def bench_clean(repeat: int, sizes: list) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in sizes:
+            rows = parse_size(label)
+            path = write_scrape(Path(tmp) / f"scrape_{label}.jsonl", rows)
+            script = CLEAN_SCRIPT.format(src=str(SRC_DIR), name=path.name, folder=tmp)
+            stats = summarize([run_fresh(script) for _ in range(repeat)])
+            results[label] = {"seconds": stats["seconds"], "rows_per_sec": rows / stats["seconds"],
+                              "peak_mb": stats["peak_mb"]}
+            path.unlink()
+
+    print(f"DatasetCleaner on synthetic JSONL scrapes, median of {repeat} runs")
+    print(f"{'rows':>6} {'seconds':>9} {'rows/s':>10} {'peak MB':>9}")
+    for label, stats in results.items():
+        print(f"{label:>6} {stats['seconds']:>9.3f} {stats['rows_per_sec']:>10.0f} {stats['peak_mb']:>9.1f}")
+    return results
+
+
+def bench_features(repeat: int, sizes: list) -> dict:
+    from preprocessing import Preprocessor
+
+    processor = Preprocessor()
+    results = {}
+    for label in sizes:
+        df = listings(parse_size(label))
+        seconds = []
+        for _ in range(repeat):
+            processor.df = df.copy()
+            seconds.append(time_call(processor.feature_engineering))
+        results[label] = throughput(seconds, len(df))
+
+    print(f"Preprocessor.feature_engineering on synthetic listings, median of {repeat} runs")
+    print(f"{'rows':>6} {'seconds':>9} {'rows/s':>10}")
+    for label, stats in results.items():
+        print(f"{label:>6} {stats['seconds']:>9.3f} {stats['rows_per_sec']:>10.0f}")
+    return results
+
+
+def bench_predict(repeat: int, sizes: list) -> dict:
+    from predict import INPUT_COLUMNS, Predictor
+
+    predictor = Predictor(BUNDLE_PATH)
+    requests = listings(SINGLE_CALLS, seed=1)[INPUT_COLUMNS].to_dict("records")
+    predictor.predict(requests[0])
+    latencies = np.array([time_call(predictor.predict, row) for row in requests]) * 1000
+    results = {"single": {"p50_ms": float(np.percentile(latencies, 50)),
+                          "p99_ms": float(np.percentile(latencies, 99)),
+                          "mean_ms": float(latencies.mean())}}
+
+    for label in sizes:
+        df = listings(parse_size(label))
+        results[f"batch {label}"] = throughput([time_call(predictor.predict_many, df) for _ in range(repeat)], len(df))
+
+    single = results["single"]
+    print(f"Predictor.predict latency over {SINGLE_CALLS} calls: p50 {single['p50_ms']:.2f} ms, "
+          f"p99 {single['p99_ms']:.2f} ms, mean {single['mean_ms']:.2f} ms")
+    print(f"Predictor.predict_many, median of {repeat} runs")
+    print(f"{'rows':>6} {'seconds':>9} {'rows/s':>10}")
+    for label in sizes:
+        stats = results[f"batch {label}"]
+        print(f"{label:>6} {stats['seconds']:>9.3f} {stats['rows_per_sec']:>10.0f}")
+    return results
+
+
+def git_commit() -> tuple:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def save_results(results: dict, repeat: int, sizes: list, folder=RESULTS_DIR) -> Path:
+    commit, dirty = git_commit()
+    created = datetime.now()
+    payload = {
+        "commit": commit, "dirty": dirty, "created_at": created.isoformat(timespec="seconds"),
+        "python": platform.python_version(), "platform": platform.platform(), "machine": platform.node(),
+        "repeat": repeat, "sizes": sizes, "results": results,
+    }
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / f"{created:%Y%m%d-%H%M%S}-{commit}{'-dirty' if dirty else ''}.json"
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(payload, file, indent=2)
+    return path
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare(base_path, new_path, threshold: float = REGRESSION_THRESHOLD) -> int:
+    runs = []
+    for path in (base_path, new_path):
+        with open(path, "r", encoding="utf-8") as file:
+            runs.append(json.load(file))
+    base, new = (flatten(run["results"]) for run in runs)
+    print(f"Comparing {runs[0]['commit']} ({runs[0]['created_at']}) -> {runs[1]['commit']} ({runs[1]['created_at']})")
+
+    regressions = 0
+    width = max(len(name) for name in base) if base else 10
+    print(f"{'metric':<{width}} {'base':>12} {'new':>12} {'change':>9}")
+    for name in sorted(base.keys() & new.keys()):
+        before, after = base[name], new[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        # Throughputs should go up, everything else (seconds, ms, MB) down.
+        worse = -change if name.endswith("per_sec") else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -threshold:
+            flag = "  improved"
+        print(f"{name:<{width}} {before:>12.4f} {after:>12.4f} {change:>+8.1%}{flag}")
+
+    missing = sorted(base.keys() ^ new.keys())
+    if missing:
+        print(f"Only in one run: {', '.join(missing)}")
+    print(f"{regressions} regressions above {threshold:.0%}")
+    return regressions
+
+
+BENCHMARKS = {
+    "startup": bench_startup, "io": bench_io, "clean": bench_clean,
+    "features": bench_features, "predict": bench_predict,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run project benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", default=",".join(SIZES),
+                        help=f"synthetic dataset sizes, comma separated ({', '.join(SIZES)} or row counts)")
+    parser.add_argument("--save", action="store_true", help=f"write results to {RESULTS_DIR}/<time>-<commit>.json")
+    parser.add_argument("--results-dir", default=str(RESULTS_DIR))
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="compare two saved result files instead of running benchmarks")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    args.sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args.repeat, args.sizes)
+        print()
+    if args.save:
+        print(f"Results saved to {save_results(results, args.repeat, args.sizes, args.results_dir)}")
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import pickle
+import argparse
+from pathlib import Path
+from datetime import datetime
+from georeference import GeoReference, load_reference
+
+# CatBoost is imported where a model is loaded or saved, so importing the feature constants
+# from here stays cheap for the serving path.
+
+BUNDLE_FORMAT = 1
+MODEL_FILE = "model.cbm"
+MANIFEST_FILE = "manifest.json"
+
+FEATURE_ORDER = [
+    'address', 'latitude', 'longitude', 'distance_from_center', 'nearest_metro',
+    'distance_to_nearest_metro', 'area', 'rooms', 'area_per_room', 'floor',
+    'max_floor', 'floor_ratio', 'category', 'repaired'
+]
+CAT_FEATURES = ['address', 'nearest_metro']
+TRANSFORMS = {
+    "log": ["price", "area"],
+    "power": {"distance_from_center": 0.25, "distance_to_nearest_metro": 0.25},
+}
+# CatBoost reads numeric features as float32, so narrower columns give identical predictions.
+# Coordinates stay float64 because distances are derived from them.
+FEATURE_DTYPES = {
+    'address': 'category', 'latitude': 'float64', 'longitude': 'float64', 'distance_from_center': 'float32',
+    'nearest_metro': 'category', 'distance_to_nearest_metro': 'float32', 'area': 'float32', 'rooms': 'int16',
+    'area_per_room': 'float32', 'floor': 'int16', 'max_floor': 'int16', 'floor_ratio': 'float32',
+    'category': 'int8', 'repaired': 'int8', 'price': 'float64'
+}
+
+
+class ModelBundle:
+    def __init__(self, model: "CatBoostRegressor", manifest: dict, path=None):
+        self.model = model
+        self.manifest = manifest
+        self.path = path
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def feature_order(self) -> list:
+        return self.manifest["feature_order"]
+
+    @property
+    def cat_features(self) -> list:
+        return [self.feature_order[i] for i in self.manifest["cat_feature_indices"]]
+
+    @property
+    def transforms(self) -> dict:
+        return self.manifest["transforms"]
+
+    @property
+    def intervals(self) -> dict:
+        # Bundles saved before intervals existed have none; callers fall back to a fixed band.
+        return self.manifest.get("intervals")
+
+    def reference(self) -> GeoReference:
+        stations = self.manifest["stations"]
+        return GeoReference(stations["landmarks"], stations["metro"])
+
+
+def new_version() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def build_manifest(model: "CatBoostRegressor", version: str, reference: GeoReference, metrics: dict = None,
+                   intervals: dict = None) -> dict:
+    import catboost
+
+    feature_order = list(model.feature_names_)
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "catboost_version": catboost.__version__,
+        "python_version": ".".join(map(str, sys.version_info[:3])),
+        "feature_order": feature_order,
+        "cat_feature_indices": [feature_order.index(name) for name in CAT_FEATURES],
+        "transforms": TRANSFORMS,
+        "stations": reference.to_dict(),
+        "metrics": metrics or {},
+        "intervals": intervals,
+    }
+
+
+def write_manifest(directory: Path, manifest: dict):
+    tmp_path = directory / f".{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, directory / MANIFEST_FILE)
+
+
+def save_bundle(model: "CatBoostRegressor", directory, version: str = None, reference: GeoReference = None,
+                metrics: dict = None, intervals: dict = None) -> Path:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    model.save_model(str(directory / MODEL_FILE), format="cbm")
+    manifest = build_manifest(model, version or new_version(), reference or load_reference(), metrics, intervals)
+    write_manifest(directory, manifest)
+    return directory
+
+
+def is_bundle(path) -> bool:
+    return (Path(path) / MANIFEST_FILE).is_file()
+
+
+def read_manifest(directory) -> dict:
+    with open(Path(directory) / MANIFEST_FILE, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')!r} in {directory}")
+    return manifest
+
+
+def load_bundle(directory) -> ModelBundle:
+    from catboost import CatBoostRegressor
+
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    model = CatBoostRegressor()
+    model.load_model(str(directory / MODEL_FILE), format="cbm")
+    return ModelBundle(model, manifest, directory)
+
+
+def export_pickle(pickle_path, directory, version: str = None) -> Path:
+    with open(pickle_path, "rb") as file:
+        model = pickle.load(file)
+    if version is None:
+        version = datetime.fromtimestamp(os.path.getmtime(pickle_path)).strftime("%Y%m%d-%H%M%S")
+    return save_bundle(model, directory, version=version)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert a pickled CatBoost model into a model bundle.")
+    parser.add_argument("pickle_path")
+    parser.add_argument("directory")
+    parser.add_argument("--version")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"Bundle written to {export_pickle(args.pickle_path, args.directory, args.version)}")
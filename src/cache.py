@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+COORD_DECIMALS = 5
+MAX_SIZE = 4096
+
+
+class PredictionCache:
+    def __init__(self, maxsize: int = MAX_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(input_data: dict) -> dict:
+        return {
+            'address': input_data['address'].lower(),
+            'latitude': round(float(input_data['latitude']), COORD_DECIMALS),
+            'longitude': round(float(input_data['longitude']), COORD_DECIMALS),
+            'area': float(input_data['area']), 'rooms': int(input_data['rooms']),
+            'floor': int(input_data['floor']), 'max_floor': int(input_data['max_floor']),
+            'category': int(input_data['category']), 'repaired': int(input_data['repaired']),
+        }
+
+    def get_or_compute(self, input_data: dict, compute, version: str = None):
+        # The model version is part of the key, so a hot-swapped model never serves stale entries.
+        normalized = self.normalize(input_data)
+        key = (version, *normalized.values())
+
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+
+        value = compute(normalized)
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                    "hit_rate": self.hits / total if total else 0.0}
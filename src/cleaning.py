@@ -1,75 +1,210 @@
+import io
+import re
 import json
-import warnings
+import argparse
+import itertools
+import pyarrow as pa
 import pandas as pd
+import pyarrow.json as pa_json
 from pathlib import Path
+from datetime import date
+from metrics import timed
+from storage import write_frame
+from listingstore import STORE_PATH, ListingStore
+
+CHUNK_SIZE = 100000
+READ_BLOCK = 1 << 20
+
+COLUMN_NAMES = {
+    "kateqoriya": "category", "mərtəbə": "floor", "sahə": "area",
+    "otaq sayı": "rooms", "çıxarış": "receipt", "təmir": "repaired", "i̇poteka": "mortgage"
+}
+RAW_COLUMNS = ["url", "price", "address", "latitude", "longitude", "category", "floor", "area",
+               "rooms", "receipt", "repaired", "mortgage"]
+COLUMN_TYPES = {
+    "latitude": "float64", "longitude": "float64", "price": "int32", "address": "category",
+    "category": "int8", "floor": "int16", "area": "int32", "rooms": "int16",
+    "receipt": "int8", "repaired": "int8", "mortgage": "int8", "max_floor": "int16"
+}
+OUTPUT_COLUMNS = ["listing_id", "url", "address", "latitude", "longitude", "area", "rooms", "floor",
+                  "max_floor", "category", "repaired", "receipt", "mortgage", "price"]
+
+ITEM_ID_PATTERN = re.compile(r'/items/(\d+)')
+FLOOR_PATTERN = re.compile(r'(\d+)\s*/\s*(\d+)')
+NUMBER_PATTERN = re.compile(r'(\d+)')
+FLAG_VALUES = {"var": 1, "yoxdur": 0}
+CATEGORY_VALUES = {"yeni tikili": 1, "köhnə tikili": 0}
+
+
+def normalize_text(value):
+    return value.lower().replace('\xa0', ' ') if isinstance(value, str) else value
+
+
+def iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n[,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[pos:].strip():
+                    raise
+                return
+            block = file.read(READ_BLOCK)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
+            continue
+        yield record
+        pos = end
+
+
+def read_json_lines(lines: list) -> pd.DataFrame:
+    try:
+        return pa_json.read_json(io.BytesIO(b"".join(lines))).to_pandas()
+    except pa.ArrowInvalid:
+        # Arrow needs one type per field; fall back for chunks that mix e.g. "1 500" and 1500.
+        return pd.DataFrame([json.loads(line) for line in lines if line.strip()])
+
+
+def iter_frames(path: Path, chunk_size: int = CHUNK_SIZE):
+    if path.suffix == ".jsonl":
+        with open(path, "rb") as file:
+            while lines := list(itertools.islice(file, chunk_size)):
+                yield read_json_lines(lines)
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        records = iter_json_array(file)
+        while batch := list(itertools.islice(records, chunk_size)):
+            yield pd.DataFrame(batch)
+
+
+def parse_distinct(column: pd.Series, parse) -> pd.DataFrame:
+    # Listing fields repeat heavily ("5 / 16", "80 m²", district names), so text is
+    # normalized and parsed once per distinct value and broadcast back by code.
+    codes, uniques = pd.factorize(column)
+    parsed = parse(pd.Series(uniques, dtype="object").map(normalize_text))
+    parsed = pd.DataFrame(parsed).reindex(range(len(uniques) + 1))
+    return parsed.iloc[codes].set_axis(column.index)
 
-warnings.filterwarnings("ignore")
 
 class DatasetCleaner:
-    def __init__(self, filename):
+    def __init__(self, filename, chunk_size: int = CHUNK_SIZE):
         self.project_folder = Path().resolve()
         self.data_folder = self.project_folder / "data"
         self.filename = filename
+        self.chunk_size = chunk_size
         self.df = None
+        self.invalid_rows = 0
 
     def load_data(self):
-        with open(self.data_folder / self.filename, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        self.df = pd.DataFrame(data)
+        yield from iter_frames(self.data_folder / self.filename, self.chunk_size)
 
     def rename_columns(self):
-        replacements = {
-            "kateqoriya": "category", "mərtəbə": "floor", "sahə": "area",
-            "otaq sayı": "rooms", "çıxarış": "receipt", "təmir": "repaired", "i̇poteka": "mortgage"
-        }
-        self.df = self.df.rename(columns=replacements)
+        self.df = self.df.rename(columns=COLUMN_NAMES).reindex(columns=RAW_COLUMNS)
+        self.df["url"] = self.df["url"].astype("object")
+
+    def assign_listing_ids(self):
+        urls = self.df["url"]
+        listing_ids = urls.str.extract(ITEM_ID_PATTERN, expand=False)
+        missing = listing_ids.isna()
+        if missing.any():
+            content = self.df.loc[missing].drop(columns=["url"]).astype(str)
+            listing_ids[missing] = "h" + pd.util.hash_pandas_object(content, index=False).astype(str)
+        self.df["listing_id"] = listing_ids
 
     def preprocess_text(self):
-        self.df = self.df.map(lambda x: x.lower() if isinstance(x, str) else x)
-        self.df = self.df.apply(lambda col: col.str.replace('\xa0', ' ', regex=False) if col.dtype == 'object' else col)
+        self.df["url"] = self.df["url"].str.lower()
+        self.df["address"] = parse_distinct(self.df["address"], lambda values: values)[0]
 
     def process_columns(self):
-        self.df["mortgage"] = self.df["mortgage"].map({"var": 1}).fillna(0).astype(int)
-        self.df.dropna(inplace=True)
-        self.df.drop_duplicates(inplace=True)
+        df = self.df
+        df["mortgage"] = parse_distinct(df["mortgage"], lambda values: values.map({"var": 1}))[0].fillna(0)
+        df["repaired"] = parse_distinct(df["repaired"], lambda values: values.map(FLAG_VALUES))[0]
+        df["receipt"] = parse_distinct(df["receipt"], lambda values: values.map(FLAG_VALUES))[0]
+        df["category"] = parse_distinct(df["category"], lambda values: values.map(CATEGORY_VALUES))[0]
 
-        replace_map = {"var": 1, "yoxdur": 0}
-        self.df[["repaired", "receipt"]] = self.df[["repaired", "receipt"]].replace(replace_map)
+        floors = parse_distinct(df["floor"], lambda values: values.str.extract(FLOOR_PATTERN).apply(pd.to_numeric))
+        df["floor"], df["max_floor"] = floors[0], floors[1]
+        df["area"] = parse_distinct(
+            df["area"], lambda values: pd.to_numeric(values.str.extract(NUMBER_PATTERN, expand=False)))[0]
+        df["rooms"] = parse_distinct(df["rooms"], lambda values: pd.to_numeric(values, errors="coerce"))[0]
+        df["price"] = parse_distinct(
+            df["price"], lambda values: pd.to_numeric(values.astype(str).str.replace(' ', ''), errors="coerce"))[0]
+        df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+        df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
 
-        self.df["category"] = self.df["category"].replace({"yeni tikili": 1, "köhnə tikili": 0})
-
-        self.df[["floor", "max_floor"]] = self.df["floor"].str.extract(r'(\d+)\s*/\s*(\d+)')
-        self.df["floor"] = pd.to_numeric(self.df["floor"], errors="coerce")
-        self.df["max_floor"] = pd.to_numeric(self.df["max_floor"], errors="coerce")
-
-        self.df["area"] = self.df["area"].str.extract(r'(\d+)')
-        self.df["price"] = self.df["price"].str.replace(' ', '')
+        rows = len(df)
+        df.dropna(subset=OUTPUT_COLUMNS[2:], inplace=True)
+        self.invalid_rows += rows - len(df)
 
     def set_column_types(self):
-        column_types = {
-            "latitude": "float64", "longitude": "float64", "price": "int64", "address": "object",
-            "category": "int64", "floor": "int64", "area": "int64", "rooms": "int64",
-            "receipt": "int64", "repaired": "int64", "mortgage": "int64", "max_floor": "int64"
-        }
-        self.df = self.df.astype(column_types)
-        self.df = self.df[["address", "latitude", "longitude", "area", "rooms", "floor",
-                           "max_floor", "category", "repaired", "receipt", "mortgage", "price"]]
+        chunk_types = {col: dtype for col, dtype in COLUMN_TYPES.items() if dtype != "category"}
+        self.df = self.df[OUTPUT_COLUMNS].astype(chunk_types)
 
-    def save_to_excel(self, filename):
-        if filename:
-            save_path = self.data_folder / f"{filename}.xlsx"
-        else:
-            save_path = self.data_folder / f"cleaned_{self.filename}".replace("json", "xlsx")
-        self.df.to_excel(save_path, index=False)
-        return save_path
-
-    def clean(self, filename=None):
-        self.load_data()
+    @timed("clean.chunk")
+    def clean_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df
         self.rename_columns()
+        self.assign_listing_ids()
         self.preprocess_text()
         self.process_columns()
         self.set_column_types()
-        return self.save_to_excel(filename)
+        return self.df
+
+    def clean_all(self):
+        self.invalid_rows = 0
+        chunks = [self.clean_chunk(df) for df in self.load_data()]
+        self.df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=OUTPUT_COLUMNS)
+        self.df.drop_duplicates("listing_id", keep="last", inplace=True)
+        self.df = self.df.astype({"address": COLUMN_TYPES["address"]}).reset_index(drop=True)
+        if self.invalid_rows:
+            print(f"Dropped {self.invalid_rows} incomplete or unparseable rows")
+        return self.df
+
+    def _save_path(self, filename, suffix):
+        if filename:
+            return self.data_folder / f"{filename}{suffix}"
+        return self.data_folder / f"cleaned_{Path(self.filename).stem}{suffix}"
+
+    def save(self, filename=None, suffix=".parquet"):
+        return write_frame(self.df, self._save_path(filename, suffix))
+
+    def save_to_excel(self, filename):
+        return write_frame(self.df, self._save_path(filename, ".xlsx"))
+
+    def scrape_date(self) -> str:
+        return date.fromtimestamp((self.data_folder / self.filename).stat().st_mtime).isoformat()
+
+    @timed("clean")
+    def clean(self, filename=None, suffix=".parquet", store: ListingStore = None, scrape_date: str = None):
+        self.clean_all()
+        if store is not None:
+            with timed("clean.store"):
+                store.upsert(self.df, scrape_date or self.scrape_date())
+        with timed("clean.save"):
+            return self.save(filename, suffix)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean a scrape into a Parquet file and the listing store.")
+    parser.add_argument("input", nargs="?", default="ootdata.jsonl",
+                        help="JSON array or JSONL file in data/, as written by scrape/scraperpw.py")
+    parser.add_argument("output", nargs="?", default="ootnew", help="output name in data/, without extension")
+    parser.add_argument("--store", default=str(STORE_PATH))
+    parser.add_argument("--scrape-date", help="YYYY-MM-DD of the scrape (default: the input file's mtime)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    return parser.parse_args()
+
 
-cleaner = DatasetCleaner("ootdata.json")
-cleaner.clean("ootnew")
\ No newline at end of file
+if __name__ == "__main__":
+    args = parse_args()
+    cleaner = DatasetCleaner(args.input, args.chunk_size)
+    with ListingStore(args.store) as store:
+        path = cleaner.clean(args.output, store=store, scrape_date=args.scrape_date)
+    print(f"Cleaned {len(cleaner.df)} listings from {args.input} -> {path}")
@@ -0,0 +1,355 @@
+"""Comparable listings: the known flats closest to a query in location and layout."""
+import os
+import json
+import math
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from bundle import TRANSFORMS
+from geogrid import METERS_PER_DEGREE
+from georeference import LATITUDE_BOUNDS, LONGITUDE_BOUNDS
+from storage import find_splits, read_frame
+
+DATA_DIR = Path("./data")
+SPLITS = ("train", "test", "oot")
+INDEX_PATH = Path("models") / "comparables"
+META_FILE = "meta.json"
+COLUMNS = ["listing_id", "address", "latitude", "longitude", "area", "rooms", "floor", "max_floor",
+           "category", "repaired", "price"]
+ORIGIN = (sum(LATITUDE_BOUNDS) / 2, sum(LONGITUDE_BOUNDS) / 2)
+# Metres one unit is worth: 10% more area counts like ~300 m, a room like 1 km, a floor like 50 m
+# and old vs new building like 1 km.
+WEIGHTS = {"area": 3000.0, "rooms": 1000.0, "floor": 50.0, "category": 1000.0}
+K = 5
+DELTA_ROWS = 5000
+REMOVED_ROWS = 1000
+LEAF_SIZE = 40
+# Rows built from the feature splits carry no listing_id; an insert replaces one of those when it
+# matches on these columns instead (coordinates to 6 decimals, about 0.1 m).
+MATCH_COLUMNS = ["latitude", "longitude", "area", "rooms", "floor", "max_floor", "category"]
+COORD_DECIMALS = 6
+
+
+def from_features(df: pd.DataFrame, price=None) -> pd.DataFrame:
+    # Feature splits keep the TRANSFORMS["log"] columns as logs; the index stores m2 and AZN.
+    frame = df.reindex(columns=COLUMNS)
+    if price is not None:
+        frame["price"] = np.asarray(price)
+    for col in TRANSFORMS["log"]:
+        frame[col] = np.exp(frame[col].to_numpy(dtype=np.float64))
+    return frame
+
+
+def read_listings(paths: list) -> pd.DataFrame:
+    frames = []
+    for path in paths:
+        df = read_frame(path)
+        frames.append(from_features(df) if "distance_from_center" in df.columns else df.reindex(columns=COLUMNS))
+    if not frames:
+        raise FileNotFoundError("No listings found to index")
+    return pd.concat(frames, ignore_index=True)
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    frame = df.reindex(columns=COLUMNS)
+    frame = frame.dropna(subset=["latitude", "longitude", "area", "rooms", "floor", "category", "price"])
+    frame = frame[frame["area"] > 0]
+    frame["listing_id"] = [None if pd.isna(value) else str(value) for value in frame["listing_id"]]
+    frame["address"] = frame["address"].astype(object).where(frame["address"].notna(), None)
+    frame["area"] = frame["area"].astype(np.float64).round(1)
+    frame["price"] = frame["price"].astype(np.float64).round()
+    for col in ("rooms", "floor", "max_floor", "category", "repaired"):
+        frame[col] = frame[col].fillna(-1).astype(np.int16)
+    return frame.reset_index(drop=True)
+
+
+def match_keys(df: pd.DataFrame) -> np.ndarray:
+    key = df[MATCH_COLUMNS].astype(np.float64).round({"latitude": COORD_DECIMALS, "longitude": COORD_DECIMALS})
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+def _replaced(rows: pd.DataFrame, keys: np.ndarray, by: pd.DataFrame, by_keys: np.ndarray) -> np.ndarray:
+    # Rows superseded by `by`: the same listing_id, or the same match key where either side has no id.
+    ids = by["listing_id"].dropna()
+    same_id = rows["listing_id"].isin(ids).to_numpy() if len(ids) else np.zeros(len(rows), bool)
+    unnamed = rows["listing_id"].isna().to_numpy()
+    by_unnamed = by["listing_id"].isna().to_numpy()
+    return (same_id | (unnamed & np.isin(keys, by_keys))
+            | (~unnamed & np.isin(keys, by_keys[by_unnamed])))
+
+
+def project(df, origin=ORIGIN, weights=WEIGHTS) -> np.ndarray:
+    lat = np.asarray(df["latitude"], dtype=np.float64)
+    lon = np.asarray(df["longitude"], dtype=np.float64)
+    return np.column_stack([
+        (lon - origin[1]) * METERS_PER_DEGREE * math.cos(math.radians(origin[0])),
+        (lat - origin[0]) * METERS_PER_DEGREE,
+        np.log(np.asarray(df["area"], dtype=np.float64)) * weights["area"],
+        np.asarray(df["rooms"], dtype=np.float64) * weights["rooms"],
+        np.asarray(df["floor"], dtype=np.float64) * weights["floor"],
+        np.asarray(df["category"], dtype=np.float64) * weights["category"],
+    ])
+
+
+def _write_atomic(path: Path, write):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_points(path: Path, points: np.ndarray):
+    # Through a file object: np.save appends ".npy" to a path that lacks it, like the tmp name.
+    with open(path, "wb") as file:
+        np.save(file, points)
+
+
+def _build_tree(points: np.ndarray):
+    from sklearn.neighbors import KDTree
+    return KDTree(points, leaf_size=LEAF_SIZE)
+
+
+class ComparablesIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = Path(path)
+        with open(self.path / META_FILE, "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.origin = tuple(self.meta["origin"])
+        self.weights = self.meta["weights"]
+
+        self.base = pd.read_parquet(self.path / f"{self.meta['base']}.parquet")
+        self.base_keys = match_keys(self.base)
+        # Only the projected points are stored; the tree is rebuilt, which takes milliseconds and
+        # keeps the index readable across scikit-learn versions.
+        self.base_points = np.load(self.path / f"{self.meta['base']}.npy")
+        self.tree = _build_tree(self.base_points)
+        delta = self.meta.get("delta")
+        self._set_delta(pd.read_parquet(self.path / delta) if delta else self.base.iloc[:0])
+
+    def __len__(self) -> int:
+        return len(self.base) - int(self.removed.sum()) + len(self.delta)
+
+    def _set_delta(self, delta: pd.DataFrame):
+        self.delta = delta.reset_index(drop=True)
+        self.delta_points = project(self.delta, self.origin, self.weights)
+        # The delta is small, so its tree is rebuilt in memory instead of being saved.
+        self.delta_tree = _build_tree(self.delta_points) if len(self.delta) else None
+        self.delta_keys = match_keys(self.delta)
+        # A base listing inserted again lives on in the delta; its base row is skipped by queries.
+        self.removed = _replaced(self.base, self.base_keys, self.delta, self.delta_keys)
+        self._listings = None
+        self._columns = None
+
+    @property
+    def listings(self) -> pd.DataFrame:
+        # Rows addressed by the positions search() returns: base rows first, then the delta.
+        if self._listings is None:
+            self._listings = pd.concat([self.base, self.delta], ignore_index=True)
+        return self._listings
+
+    @property
+    def columns(self) -> dict:
+        # Column arrays and projected points of listings, so a single query skips DataFrame indexing.
+        if self._columns is None:
+            self._columns = {col: self.listings[col].to_numpy() for col in COLUMNS}
+            self._columns["points"] = np.vstack([self.base_points, self.delta_points])
+        return self._columns
+
+    def _search_base(self, points: np.ndarray, k: int):
+        # Replaced rows are skipped by asking the tree for k, 2k, ... neighbours, and only for the
+        # rows that still have fewer than k live ones, so a few replacements cost little.
+        dist = np.full((len(points), k), np.inf)
+        idx = np.zeros((len(points), k), dtype=np.intp)
+        pending = np.arange(len(points))
+        fetch = k
+        while len(pending):
+            fetch = min(fetch, len(self.base))
+            found_dist, found_idx = self.tree.query(points[pending], k=fetch)
+            live = ~self.removed[found_idx]
+            done = (live.sum(axis=1) >= k) | (fetch == len(self.base))
+            order = np.argsort(~live[done], axis=1, kind="stable")[:, :k]
+            dist[pending[done]] = np.where(np.take_along_axis(live[done], order, axis=1),
+                                           np.take_along_axis(found_dist[done], order, axis=1), np.inf)
+            idx[pending[done]] = np.take_along_axis(found_idx[done], order, axis=1)
+            pending = pending[~done]
+            fetch *= 2
+        return dist, idx
+
+    def search(self, points: np.ndarray, k: int = K):
+        k = min(k, len(self))
+        dist = np.empty((len(points), 0))
+        idx = np.empty((len(points), 0), dtype=np.intp)
+        if k == 0:
+            return dist, idx
+
+        if len(self.base) > self.removed.sum():
+            dist, idx = self._search_base(points, min(k, len(self.base)))
+        if self.delta_tree is not None:
+            delta_dist, delta_idx = self.delta_tree.query(points, k=min(k, len(self.delta)))
+            dist = np.hstack([dist, delta_dist])
+            idx = np.hstack([idx, delta_idx + len(self.base)])
+
+        order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+    def query(self, flat: dict, k: int = K) -> pd.DataFrame:
+        point = project({key: [flat[key]] for key in ("latitude", "longitude", "area", "rooms", "floor", "category")},
+                        self.origin, self.weights)
+        dist, idx = self.search(point, k)
+        columns = self.columns
+        offset = columns["points"][idx[0], :2] - point[0, :2]
+        rows = {col: columns[col][idx[0]] for col in COLUMNS}
+        rows["distance_m"] = np.hypot(offset[:, 0], offset[:, 1]).round()
+        rows["match_m"] = dist[0].round()
+        return pd.DataFrame(rows)
+
+    def query_many(self, df: pd.DataFrame, k: int = K):
+        return self.search(project(df, self.origin, self.weights), k)
+
+    def warmup(self):
+        self.query({"latitude": ORIGIN[0], "longitude": ORIGIN[1], "area": 70.0, "rooms": 2, "floor": 5,
+                    "category": 1})
+        return self
+
+    def insert(self, df: pd.DataFrame, compact_at: int = DELTA_ROWS, max_removed: int = REMOVED_ROWS) -> int:
+        rows = normalize(df)
+        named = rows["listing_id"].notna()
+        unnamed = rows[~named]
+        rows = pd.concat([rows[named].drop_duplicates("listing_id", keep="last"),
+                          unnamed[~pd.Index(match_keys(unnamed)).duplicated(keep="last")]])
+        stale = _replaced(self.delta, self.delta_keys, rows, match_keys(rows))
+        delta = pd.concat([self.delta[~stale], rows], ignore_index=True)
+
+        self._set_delta(delta)
+        if len(delta) > max(compact_at, len(self.base) // 10) or self.removed.sum() > max_removed:
+            self.compact()
+        else:
+            self._save(delta=delta)
+        return len(rows)
+
+    def compact(self):
+        self._save(base=pd.concat([self.base[~self.removed], self.delta], ignore_index=True),
+                   delta=self.base.iloc[:0])
+
+    def _save(self, base: pd.DataFrame = None, delta: pd.DataFrame = None):
+        meta, points = _save(self.path, self.meta, base, delta)
+        if base is not None:
+            self.base, self.base_points = base.reset_index(drop=True), points
+            self.tree = _build_tree(points)
+            self.base_keys = match_keys(self.base)
+        self.meta = meta
+        self._set_delta(delta)
+
+
+def _save(path: Path, meta: dict, base: pd.DataFrame = None, delta: pd.DataFrame = None):
+    previous, points = meta, None
+    generation = meta.get("generation", 0) + 1
+    meta = {**meta, "generation": generation, "updated_at": datetime.now().isoformat(timespec="seconds")}
+
+    if base is not None:
+        base = base.reset_index(drop=True)
+        points = project(base, meta["origin"], meta["weights"])
+        meta["base"] = f"base-{generation:06d}"
+        meta["base_rows"] = len(base)
+        _write_atomic(path / f"{meta['base']}.parquet", lambda tmp: base.to_parquet(tmp, index=False))
+        _write_atomic(path / f"{meta['base']}.npy", lambda tmp: _write_points(tmp, points))
+
+    if delta is not None and len(delta):
+        meta["delta"] = f"delta-{generation:06d}.parquet"
+        meta["delta_rows"] = len(delta)
+        _write_atomic(path / meta["delta"], lambda tmp: delta.to_parquet(tmp, index=False))
+    elif delta is not None:
+        meta["delta"], meta["delta_rows"] = None, 0
+
+    _write_atomic(path / META_FILE, lambda tmp: tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8"))
+
+    # Files of the previous generation stay until the next save, for readers still loading them.
+    keep = {META_FILE}
+    for generation_meta in (previous, meta):
+        if generation_meta.get("base"):
+            keep.update((f"{generation_meta['base']}.parquet", f"{generation_meta['base']}.npy"))
+        keep.add(generation_meta.get("delta"))
+    for stale in path.iterdir():
+        if stale.name not in keep and not stale.name.startswith("."):
+            stale.unlink()
+    return meta, points
+
+
+def build(listings: pd.DataFrame, path=INDEX_PATH) -> ComparablesIndex:
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    previous = {}
+    if (path / META_FILE).exists():
+        with open(path / META_FILE, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+
+    meta = {**previous, "created_at": datetime.now().isoformat(timespec="seconds"),
+            "origin": list(ORIGIN), "weights": WEIGHTS}
+    _save(path, meta, base=normalize(listings), delta=pd.DataFrame(columns=COLUMNS))
+    return ComparablesIndex(path)
+
+
+def stamp(path=INDEX_PATH):
+    # Changes whenever an insert, compaction or rebuild replaces meta.json; None without an index.
+    try:
+        return (Path(path) / META_FILE).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build, extend or query the comparable listings index.")
+    parser.add_argument("--index", default=str(INDEX_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="index listings from files (default: data splits)")
+    build_parser.add_argument("listings", nargs="*")
+    insert = commands.add_parser("insert", help="add a scrape batch from files or the listing store")
+    insert.add_argument("listings", nargs="*", help="cleaned listings in the shape DatasetCleaner produces")
+    insert.add_argument("--store", help="listing store to read the batch from")
+    insert.add_argument("--since", help="first scrape date (YYYY-MM-DD) to take from the store")
+    commands.add_parser("compact", help="merge inserted listings into the tree")
+    commands.add_parser("info")
+    query = commands.add_parser("query", help="print the comparables of one flat")
+    for key in ("latitude", "longitude", "area"):
+        query.add_argument(f"--{key}", type=float, required=True)
+    for key in ("rooms", "floor", "category"):
+        query.add_argument(f"--{key}", type=int, required=True)
+    query.add_argument("-k", type=int, default=K)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        index = build(read_listings(args.listings or find_splits(DATA_DIR, SPLITS)), args.index)
+        print(f"Indexed {len(index)} listings in {args.index} in {time.perf_counter() - start:.1f}s")
+    elif args.command == "insert":
+        if args.store:
+            from listingstore import ListingStore
+
+            with ListingStore(args.store) as store:
+                batch = store.query(start=args.since)
+        else:
+            batch = read_listings(args.listings)
+        index = ComparablesIndex(args.index)
+        added = index.insert(batch)
+        print(f"Inserted {added} listings: {len(index.base)} in the tree, {len(index.delta)} pending compaction")
+    elif args.command == "compact":
+        index = ComparablesIndex(args.index)
+        index.compact()
+        print(f"Compacted {len(index)} listings into the tree")
+    elif args.command == "info":
+        index = ComparablesIndex(args.index)
+        print(f"{len(index)} listings: {len(index.base)} in the tree ({int(index.removed.sum())} replaced), "
+              f"{len(index.delta)} pending compaction; generation {index.meta['generation']}, "
+              f"updated {index.meta['updated_at']}")
+    else:
+        index = ComparablesIndex(args.index)
+        flat = {key: getattr(args, key) for key in ("latitude", "longitude", "area", "rooms", "floor", "category")}
+        start = time.perf_counter()
+        rows = index.query(flat, args.k)
+        print(rows.to_string(index=False))
+        print(f"{(time.perf_counter() - start) * 1000:.2f} ms")
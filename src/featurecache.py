@@ -0,0 +1,85 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+from pathlib import Path
+from storage import read_frame, write_frame
+
+FEATURE_INPUTS = ['latitude', 'longitude', 'area', 'rooms', 'floor', 'max_floor']
+ROW_KEY = '_row_key'
+READ_BLOCK = 1 << 20
+
+
+def hash_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_params(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    inputs = df[FEATURE_INPUTS].astype("float64")
+    return pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+
+
+class FeatureCache:
+    def __init__(self, root, code_key: str):
+        self.folder = Path(root) / code_key[:16]
+        self.rows_folder = self.folder / "rows"
+        self._rows = None
+
+    def frame_path(self, file_hash: str) -> Path:
+        return self.folder / f"{file_hash[:16]}.parquet"
+
+    def load_frame(self, file_hash: str):
+        path = self.frame_path(file_hash)
+        return read_frame(path) if path.exists() else None
+
+    def save_frame(self, file_hash: str, df: pd.DataFrame):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        write_frame(df, self.frame_path(file_hash))
+
+    def _load_rows(self) -> pd.DataFrame:
+        if self._rows is None:
+            parts = sorted(self.rows_folder.glob("*.parquet"))
+            if parts:
+                rows = ds.dataset(parts, format="parquet").to_table().to_pandas()
+                self._rows = rows.drop_duplicates(ROW_KEY).set_index(ROW_KEY)
+            else:
+                self._rows = pd.DataFrame()
+        return self._rows
+
+    def _append_rows(self, keys: np.ndarray, derived: pd.DataFrame, tag: str):
+        new_rows = derived.assign(**{ROW_KEY: keys}).drop_duplicates(ROW_KEY)
+        self.rows_folder.mkdir(parents=True, exist_ok=True)
+        write_frame(new_rows.reset_index(drop=True), self.rows_folder / f"{tag[:16]}.parquet")
+        new_rows = new_rows.set_index(ROW_KEY)
+        self._rows = new_rows if self._rows.empty else pd.concat([self._rows, new_rows])
+
+    def derive(self, df: pd.DataFrame, compute, tag: str) -> pd.DataFrame:
+        if df.empty:
+            return compute(df)
+
+        keys = row_keys(df)
+        rows = self._load_rows()
+        known = np.isin(keys, rows.index.to_numpy()) if len(rows) else np.zeros(len(df), dtype=bool)
+        missing = ~known
+        print(f"Feature cache: reusing {known.sum()} of {len(df)} rows")
+
+        if not missing.any():
+            return rows.loc[keys].set_axis(df.index)
+
+        computed = compute(df[missing])
+        self._append_rows(keys[missing], computed, tag)
+        if not known.any():
+            return computed
+
+        reused = rows.loc[keys[known], computed.columns].set_axis(df.index[known])
+        return pd.concat([reused, computed]).loc[df.index]
@@ -0,0 +1,214 @@
+"""Precomputed lookup grid for the location features used at serving time."""
+import os
+import json
+import math
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from georeference import LATITUDE_BOUNDS, LONGITUDE_BOUNDS, GeoReference
+
+GRID_PATH = Path("models") / "geogrid"
+GRID_FILE = "grid.json"
+DISTANCES_FILE = "distances.npy"
+METRO_FILE = "metro.npy"
+RESOLUTION_M = 25.0
+METERS_PER_DEGREE = 111320.0
+EXACT = 255
+EXACT_RADIUS_CELLS = 2
+BUILD_ROWS = 32
+ERROR_SAMPLES = 200000
+
+
+def stations_hash(reference: GeoReference) -> str:
+    payload = json.dumps(reference.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def grid_axes(resolution_m: float, lat_bounds=LATITUDE_BOUNDS, lon_bounds=LONGITUDE_BOUNDS):
+    mid_lat = math.radians(sum(lat_bounds) / 2)
+    lat_step = resolution_m / METERS_PER_DEGREE
+    lon_step = resolution_m / (METERS_PER_DEGREE * math.cos(mid_lat))
+    n_lat = math.ceil((lat_bounds[1] - lat_bounds[0]) / lat_step) + 1
+    n_lon = math.ceil((lon_bounds[1] - lon_bounds[0]) / lon_step) + 1
+    lats = lat_bounds[0] + lat_step * np.arange(n_lat)
+    lons = lon_bounds[0] + lon_step * np.arange(n_lon)
+    return lats, lons
+
+
+def _write_array(path: Path, shape: tuple, dtype) -> np.memmap:
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+class GeoGrid:
+    def __init__(self, path=GRID_PATH, reference: GeoReference = None):
+        self.path = Path(path)
+        with open(self.path / GRID_FILE, "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.reference = reference or GeoReference(**self.meta["stations"])
+        if stations_hash(self.reference) != self.meta["stations_hash"]:
+            raise ValueError(f"Grid in {self.path} was built for other stations, rebuild it for this model")
+
+        self.lat0, self.lon0 = self.meta["origin"]
+        self.lat_step, self.lon_step = self.meta["step"]
+        self.n_lat, self.n_lon = self.meta["shape"]
+        self.distances = np.load(self.path / DISTANCES_FILE, mmap_mode="r")
+        self.metro = np.load(self.path / METRO_FILE, mmap_mode="r")
+
+    @property
+    def error(self) -> dict:
+        return self.meta["error"]
+
+    def lookup(self, lat, lon):
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        fi = (lat - self.lat0) / self.lat_step
+        fj = (lon - self.lon0) / self.lon_step
+        i = np.floor(fi).astype(np.int64)
+        j = np.floor(fj).astype(np.int64)
+        inside = (i >= 0) & (i < self.n_lat - 1) & (j >= 0) & (j < self.n_lon - 1)
+        i = np.where(inside, i, 0)
+        j = np.where(inside, j, 0)
+        ty, tx = fi - i, fj - j
+
+        m00, m01 = self.metro[i, j], self.metro[i, j + 1]
+        m10, m11 = self.metro[i + 1, j], self.metro[i + 1, j + 1]
+        # Voronoi cells are convex, so four corners with one nearest station mean the whole cell has it.
+        exact = ~inside | (m00 == EXACT) | (m00 != m01) | (m00 != m10) | (m00 != m11)
+
+        d = self.distances
+        values = (d[:, i, j] * ((1 - ty) * (1 - tx)) + d[:, i, j + 1] * ((1 - ty) * tx)
+                  + d[:, i + 1, j] * (ty * (1 - tx)) + d[:, i + 1, j + 1] * (ty * tx))
+        center, metro_dist = values[0].astype(np.float64), values[1].astype(np.float64)
+        metro_idx = m00.astype(np.intp)
+
+        if exact.any():
+            center[exact] = self.reference.distance_from_center(lat[exact], lon[exact])
+            metro_idx[exact], metro_dist[exact] = self.reference.metro.nearest(lat[exact], lon[exact])
+        return center, metro_idx, metro_dist
+
+    def lookup_one(self, lat: float, lon: float):
+        # Scalar path for single requests: a handful of memmap reads instead of array setup.
+        fi = (lat - self.lat0) / self.lat_step
+        fj = (lon - self.lon0) / self.lon_step
+        i, j = math.floor(fi), math.floor(fj)
+        if 0 <= i < self.n_lat - 1 and 0 <= j < self.n_lon - 1:
+            corners = self.metro[i:i + 2, j:j + 2]
+            station = int(corners[0, 0])
+            if station != EXACT and (corners == station).all():
+                ty, tx = fi - i, fj - j
+                cell = self.distances[:, i:i + 2, j:j + 2].astype(np.float64)
+                values = (cell[:, 0, 0] * (1 - ty) * (1 - tx) + cell[:, 0, 1] * (1 - ty) * tx
+                          + cell[:, 1, 0] * ty * (1 - tx) + cell[:, 1, 1] * ty * tx)
+                return float(values[0]), station, float(values[1])
+
+        center = float(self.reference.distance_from_center(lat, lon))
+        idx, dist = self.reference.metro.nearest(lat, lon)
+        return center, int(idx[0]), float(dist[0])
+
+    def measure_error(self, samples: int = ERROR_SAMPLES, seed: int = 0) -> dict:
+        rng = np.random.default_rng(seed)
+        lat = rng.uniform(self.lat0, self.lat0 + self.lat_step * (self.n_lat - 1), samples)
+        lon = rng.uniform(self.lon0, self.lon0 + self.lon_step * (self.n_lon - 1), samples)
+        center, metro_idx, metro_dist = self.lookup(lat, lon)
+
+        exact_center = self.reference.distance_from_center(lat, lon)
+        exact_idx, exact_dist = self.reference.metro.nearest(lat, lon)
+        center_error = np.abs(center - exact_center)
+        metro_error = np.abs(metro_dist - exact_dist)
+        return {
+            "samples": samples,
+            "center_max_m": float(center_error.max()), "center_p99_m": float(np.percentile(center_error, 99)),
+            "metro_max_m": float(metro_error.max()), "metro_p99_m": float(np.percentile(metro_error, 99)),
+            "metro_name_mismatches": int((metro_idx != exact_idx).sum()),
+        }
+
+
+def build(reference: GeoReference, path=GRID_PATH, resolution_m: float = RESOLUTION_M) -> GeoGrid:
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    lats, lons = grid_axes(resolution_m)
+    if len(reference.metro) >= EXACT:
+        raise ValueError(f"At most {EXACT - 1} metro stations fit the uint8 station index")
+
+    tmp_distances = path / f".{DISTANCES_FILE}.tmp"
+    tmp_metro = path / f".{METRO_FILE}.tmp"
+    distances = _write_array(tmp_distances, (2, len(lats), len(lons)), np.float32)
+    metro = _write_array(tmp_metro, (len(lats), len(lons)), np.uint8)
+
+    print(f"Building {len(lats)} x {len(lons)} grid at {resolution_m:g} m")
+    for start in range(0, len(lats), BUILD_ROWS):
+        rows = lats[start:start + BUILD_ROWS]
+        lat, lon = (grid.ravel() for grid in np.meshgrid(rows, lons, indexing="ij"))
+        shape = (len(rows), len(lons))
+        distances[0, start:start + len(rows)] = reference.distance_from_center(lat, lon).reshape(shape)
+        idx, dist = reference.metro.nearest(lat, lon)
+        distances[1, start:start + len(rows)] = dist.reshape(shape)
+        metro[start:start + len(rows)] = idx.reshape(shape)
+
+    # Distance surfaces have a kink at their source point; cells around one are always exact.
+    lat_step, lon_step = lats[1] - lats[0], lons[1] - lons[0]
+    for point_lat, point_lon in [reference.city_center_coords, *reference.metro.coords]:
+        i = int((point_lat - lats[0]) / lat_step)
+        j = int((point_lon - lons[0]) / lon_step)
+        metro[max(i - EXACT_RADIUS_CELLS, 0):i + EXACT_RADIUS_CELLS + 2,
+              max(j - EXACT_RADIUS_CELLS, 0):j + EXACT_RADIUS_CELLS + 2] = EXACT
+
+    distances.flush()
+    metro.flush()
+    del distances, metro
+    os.replace(tmp_distances, path / DISTANCES_FILE)
+    os.replace(tmp_metro, path / METRO_FILE)
+
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "resolution_m": resolution_m,
+        "origin": [float(lats[0]), float(lons[0])],
+        "step": [float(lat_step), float(lon_step)],
+        "shape": [len(lats), len(lons)],
+        "stations": reference.to_dict(),
+        "stations_hash": stations_hash(reference),
+        "error": {},
+    }
+    with open(path / GRID_FILE, "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2, ensure_ascii=False)
+
+    grid = GeoGrid(path, reference)
+    grid.meta["error"] = grid.measure_error()
+    with open(path / GRID_FILE, "w", encoding="utf-8") as file:
+        json.dump(grid.meta, file, indent=2, ensure_ascii=False)
+    return grid
+
+
+def print_error(grid: GeoGrid):
+    error = grid.error
+    print(f"Interpolation error over {error['samples']} random points: "
+          f"center max {error['center_max_m']:.3f} m (p99 {error['center_p99_m']:.3f} m), "
+          f"metro max {error['metro_max_m']:.3f} m (p99 {error['metro_p99_m']:.3f} m), "
+          f"{error['metro_name_mismatches']} nearest-station mismatches")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or inspect the location feature lookup grid.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--model", default="./models/bundle", help="bundle whose stations the grid is built for")
+    parser.add_argument("--output", default=str(GRID_PATH))
+    parser.add_argument("--resolution", type=float, default=RESOLUTION_M, help="grid spacing in metres")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "build":
+        from bundle import is_bundle, load_bundle
+        from georeference import load_reference
+
+        reference = load_bundle(args.model).reference() if is_bundle(args.model) else load_reference()
+        grid = build(reference, args.output, args.resolution)
+        size = sum((Path(args.output) / name).stat().st_size for name in (DISTANCES_FILE, METRO_FILE))
+        print(f"Grid written to {args.output} ({size / 2 ** 20:.0f} MB)")
+    else:
+        grid = GeoGrid(args.output)
+        print(f"{grid.n_lat} x {grid.n_lon} grid at {grid.meta['resolution_m']:g} m, built {grid.meta['created_at']}")
+    print_error(grid)
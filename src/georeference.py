@@ -0,0 +1,143 @@
+import json
+import numpy as np
+from pathlib import Path
+from functools import lru_cache
+from geo import EARTH_RADIUS_M, distance_matrix, distance_to_point, vincenty
+
+STATIONS_PATH = Path(__file__).resolve().parent.parent / "data" / "stations.json"
+CITY_CENTER = "City Center"
+LATITUDE_BOUNDS = (40, 40.65)
+LONGITUDE_BOUNDS = (49.25, 50.5)
+
+# Haversine on the mean-radius sphere deviates from the WGS-84 geodesic by less than this
+# fraction, so every station that can be geodesically nearest lies inside the widened radius.
+SPHERE_ERROR = 0.005
+NEAREST_CANDIDATES = 4
+# Queries up to this many point-station pairs compare against every station directly, which keeps
+# single requests off the tree (and scikit-learn's import) entirely.
+BRUTE_FORCE_PAIRS = 2 ** 16
+
+
+class StationIndex:
+    def __init__(self, stations: dict):
+        self.names = list(stations)
+        self.coords = np.asarray(list(stations.values()), dtype=np.float64).reshape(-1, 2)
+        self._tree = None
+
+    @property
+    def tree(self):
+        # scikit-learn takes about a second to import, so the tree is built on the first query.
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(np.radians(self.coords), metric="haversine")
+        return self._tree
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prepare(self, lat, lon):
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        return lat, lon, np.radians(np.column_stack([lat, lon]))
+
+    def _exact(self, lat, lon, rows, idx):
+        return vincenty(lat[rows], lon[rows], self.coords[idx, 0], self.coords[idx, 1])
+
+    def query(self, lat, lon, k: int = 1):
+        lat, lon, points = self._prepare(lat, lon)
+        k = min(k, len(self))
+        _, idx = self.tree.query(points, k=k)
+        rows = np.repeat(np.arange(len(lat)), k)
+        distances = self._exact(lat, lon, rows, idx.ravel()).reshape(-1, k)
+        order = np.argsort(distances, axis=1, kind="stable")
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+    def query_radius(self, lat, lon, radius_m):
+        lat, lon, points = self._prepare(lat, lon)
+        radius = np.broadcast_to(np.asarray(radius_m, dtype=np.float64), lat.shape)
+        candidates = self.tree.query_radius(points, r=radius * (1 + SPHERE_ERROR) / EARTH_RADIUS_M)
+
+        results = []
+        for row, idx in enumerate(candidates):
+            distances = self._exact(lat, lon, np.full(len(idx), row), idx)
+            keep = distances <= radius[row]
+            order = np.argsort(distances[keep], kind="stable")
+            results.append((idx[keep][order], distances[keep][order]))
+        return results
+
+    def _nearest_candidates(self, lat, lon):
+        # Every station within the widened radius of the spherically nearest one can be geodesically nearest.
+        sphere_dist = distance_matrix(lat, lon, self.coords, method="haversine")
+        radius = sphere_dist.min(axis=1) * (1 + SPHERE_ERROR) / (1 - SPHERE_ERROR) + 1e-6
+        return np.nonzero(sphere_dist <= radius[:, None])
+
+    def nearest(self, lat, lon):
+        lat, lon, points = self._prepare(lat, lon)
+        if not len(lat):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        if len(lat) * len(self) <= BRUTE_FORCE_PAIRS:
+            rows, idx = self._nearest_candidates(lat, lon)
+            return self._closest(lat, lon, rows, idx)
+
+        k = min(NEAREST_CANDIDATES, len(self))
+        sphere_dist, idx = self.tree.query(points, k=k)
+        rows = np.repeat(np.arange(len(lat)), k)
+        idx = idx.ravel()
+
+        if k < len(self):
+            # Rows whose k-th candidate is still within the widened radius of the first one may
+            # have more contenders, so fall back to a radius query for just those rows.
+            radius = sphere_dist[:, 0] * (1 + SPHERE_ERROR) / (1 - SPHERE_ERROR) + 1e-12
+            incomplete = np.flatnonzero(sphere_dist[:, -1] <= radius)
+            if len(incomplete):
+                extra = self.tree.query_radius(points[incomplete], r=radius[incomplete])
+                counts = np.fromiter((len(c) for c in extra), dtype=np.intp, count=len(extra))
+                rows = np.concatenate([rows, np.repeat(incomplete, counts)])
+                idx = np.concatenate([idx, *extra])
+
+        return self._closest(lat, lon, rows, idx)
+
+    def _closest(self, lat, lon, rows, idx):
+        distances = self._exact(lat, lon, rows, idx)
+
+        # Ties resolve to the station listed first, like the original per-station loop.
+        order = np.lexsort((idx, distances, rows))
+        first = np.searchsorted(rows[order], np.arange(len(lat)))
+        best = order[first]
+        return idx[best], distances[best]
+
+
+class GeoReference:
+    def __init__(self, landmarks: dict, metro: dict):
+        self.landmarks = {name: tuple(coords) for name, coords in landmarks.items()}
+        self.metro = StationIndex(metro)
+        self.metro_names = np.array([name.lower() for name in self.metro.names], dtype=object)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(data["landmarks"], data["metro"])
+
+    def to_dict(self) -> dict:
+        return {
+            "landmarks": {name: list(coords) for name, coords in self.landmarks.items()},
+            "metro": {name: list(coords) for name, coords in zip(self.metro.names, self.metro.coords.tolist())},
+        }
+
+    @property
+    def city_center_coords(self) -> tuple:
+        return self.landmarks[CITY_CENTER]
+
+    def distance_from_center(self, lat, lon) -> np.ndarray:
+        return distance_to_point(lat, lon, self.city_center_coords)
+
+    def nearest_metro(self, lat, lon):
+        idx, distances = self.metro.nearest(lat, lon)
+        return self.metro_names[idx], distances
+
+
+@lru_cache(maxsize=None)
+def load_reference(path=STATIONS_PATH) -> GeoReference:
+    return GeoReference.from_json(path)
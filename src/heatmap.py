@@ -0,0 +1,192 @@
+"""Precomputed price overlay for the map in app.py."""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from geo import EARTH_RADIUS_M
+from geogrid import grid_axes
+from storage import find_splits, read_frame
+
+DATA_DIR = Path("./data")
+HEATMAP_DIR = Path("models") / "heatmap"
+SPLITS = ("train", "test", "oot")
+RESOLUTION_M = 200.0
+MAX_GAP_M = 1000.0
+CHUNK_SIZE = 20000
+OPACITY = 0.6
+# Green -> yellow -> red, interpolated over the 5th-95th percentile of predicted prices.
+COLOR_STOPS = ((0.0, (26, 150, 65)), (0.5, (255, 255, 191)), (1.0, (215, 25, 28)))
+PROFILE = {"area": 70.0, "rooms": 2, "floor": 5, "max_floor": 12, "category": 1, "repaired": 1}
+
+_predictor = None
+
+
+def profile_name(profile: dict) -> str:
+    return (f"{profile['rooms']}r-{profile['area']:g}m2-f{profile['floor']}of{profile['max_floor']}"
+            f"-c{profile['category']}-r{profile['repaired']}")
+
+
+def listing_paths(folder=DATA_DIR) -> list:
+    return find_splits(folder, SPLITS)
+
+
+def load_listings(paths: list) -> pd.DataFrame:
+    frames = [read_frame(path, columns=["address", "latitude", "longitude"]) for path in paths]
+    if not frames:
+        raise FileNotFoundError("No listings found to place districts on the grid")
+    df = pd.concat(frames, ignore_index=True).dropna()
+    df["address"] = df["address"].astype(str)
+    return df
+
+
+def assign_districts(listings: pd.DataFrame, resolution_m: float, max_gap_m: float):
+    from sklearn.neighbors import BallTree
+
+    # Grid over the 0.5-99.5 percentile box of listings, so a few stray coordinates don't blow it up.
+    lat_bounds = tuple(np.percentile(listings["latitude"], [0.5, 99.5]))
+    lon_bounds = tuple(np.percentile(listings["longitude"], [0.5, 99.5]))
+    lats, lons = grid_axes(resolution_m, lat_bounds, lon_bounds)
+    lat, lon = (grid.ravel() for grid in np.meshgrid(lats, lons, indexing="ij"))
+
+    tree = BallTree(np.radians(listings[["latitude", "longitude"]].to_numpy()), metric="haversine")
+    distance, idx = tree.query(np.radians(np.column_stack([lat, lon])), k=1)
+    covered = distance[:, 0] * EARTH_RADIUS_M <= max_gap_m
+
+    cells = pd.DataFrame({
+        "cell": np.flatnonzero(covered),
+        "address": listings["address"].to_numpy()[idx[covered, 0]],
+        "latitude": lat[covered], "longitude": lon[covered],
+    })
+    return lats, lons, cells
+
+
+def _init_worker(model_path: str, grid_path: str):
+    global _predictor
+    from predict import Predictor
+    _predictor = Predictor(model_path, grid_path=grid_path)
+
+
+def _score_cells(cells: pd.DataFrame) -> np.ndarray:
+    return _predictor.predict_many(cells)
+
+
+def score_cells(cells: pd.DataFrame, profile: dict, model_path: str, grid_path: str = None,
+                workers: int = 1, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rows = cells.assign(**profile)
+    chunks = [rows.iloc[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path, grid_path)) as pool:
+            parts = list(pool.map(_score_cells, chunks))
+    else:
+        _init_worker(model_path, grid_path)
+        parts = [_score_cells(chunk) for chunk in chunks]
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def colorize(prices: np.ndarray, low: float, high: float) -> np.ndarray:
+    position = np.clip((prices - low) / max(high - low, 1.0), 0, 1)
+    stops = np.array([stop for stop, _ in COLOR_STOPS])
+    colors = np.array([color for _, color in COLOR_STOPS], dtype=np.float64)
+    rgb = np.column_stack([np.interp(position, stops, colors[:, channel]) for channel in range(3)])
+    return rgb.round().astype(np.uint8)
+
+
+def render(lats, lons, cells: pd.DataFrame, prices: np.ndarray):
+    from branca.utilities import write_png
+
+    low, high = (float(value) for value in np.percentile(prices, [5, 95]))
+    image = np.zeros((len(lats) * len(lons), 4), dtype=np.uint8)
+    image[cells["cell"].to_numpy(), :3] = colorize(prices, low, high)
+    image[cells["cell"].to_numpy(), 3] = 255
+    # Rows run south to north; the PNG starts at the top, so flip them.
+    return write_png(image.reshape(len(lats), len(lons), 4), origin="lower"), low, high
+
+
+def build(profile: dict, model_path: str, output_dir=HEATMAP_DIR, listings: pd.DataFrame = None,
+          resolution_m: float = RESOLUTION_M, max_gap_m: float = MAX_GAP_M, grid_path: str = None,
+          workers: int = 1) -> Path:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    listings = load_listings(listing_paths()) if listings is None else listings
+
+    start = time.perf_counter()
+    lats, lons, cells = assign_districts(listings, resolution_m, max_gap_m)
+    print(f"Scoring {len(cells)} of {len(lats) * len(lons)} cells at {resolution_m:g} m "
+          f"across {cells['address'].nunique()} districts")
+    prices = score_cells(cells, profile, model_path, grid_path, workers)
+    png, low, high = render(lats, lons, cells, prices)
+
+    half_lat = (lats[1] - lats[0]) / 2
+    half_lon = (lons[1] - lons[0]) / 2
+    districts = pd.Series(prices).groupby(cells["address"].to_numpy()).median().round()
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "model": str(model_path),
+        "profile": profile,
+        "resolution_m": resolution_m,
+        "bounds": [[float(lats[0] - half_lat), float(lons[0] - half_lon)],
+                   [float(lats[-1] + half_lat), float(lons[-1] + half_lon)]],
+        "price_range": [round(low), round(high)],
+        "colors": [[stop, "#%02x%02x%02x" % color] for stop, color in COLOR_STOPS],
+        "opacity": OPACITY,
+        "districts": {name: int(price) for name, price in districts.items()},
+    }
+
+    name = profile_name(profile)
+    for suffix, content in ((".png", png), (".json", json.dumps(meta, indent=2, ensure_ascii=False).encode("utf-8"))):
+        path = output_dir / f"{name}{suffix}"
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    print(f"Overlay {name} written to {output_dir} in {time.perf_counter() - start:.1f}s "
+          f"(prices {low:,.0f} - {high:,.0f} AZN)")
+    return output_dir / f"{name}.png"
+
+
+def available(output_dir=HEATMAP_DIR) -> list:
+    output_dir = Path(output_dir)
+    if not output_dir.is_dir():
+        return []
+    return sorted(path.stem for path in output_dir.glob("*.json") if path.with_suffix(".png").exists())
+
+
+def stamp(name: str, output_dir=HEATMAP_DIR) -> int:
+    # Changes whenever build() rewrites the overlay.
+    output_dir = Path(output_dir)
+    return max((output_dir / f"{name}{suffix}").stat().st_mtime_ns for suffix in (".png", ".json"))
+
+
+def load_overlay(name: str, output_dir=HEATMAP_DIR):
+    output_dir = Path(output_dir)
+    with open(output_dir / f"{name}.json", "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    return (output_dir / f"{name}.png").read_bytes(), meta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute a price overlay for the app map.")
+    parser.add_argument("--model", default="./models/bundle")
+    parser.add_argument("--output", default=str(HEATMAP_DIR))
+    parser.add_argument("--listings", nargs="*", help="files with address/latitude/longitude (default: data splits)")
+    parser.add_argument("--resolution", type=float, default=RESOLUTION_M, help="cell size in metres")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP_M,
+                        help="leave cells farther than this many metres from any listing empty")
+    parser.add_argument("--geogrid", default=os.environ.get("HPP_GEOGRID_PATH"),
+                        help="precomputed location grid to speed up scoring")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    for key, value in PROFILE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    profile = {key: getattr(args, key) for key in PROFILE}
+    listings = load_listings(args.listings or listing_paths())
+    build(profile, args.model, args.output, listings, args.resolution, args.max_gap, args.geogrid, args.workers)
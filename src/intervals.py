@@ -0,0 +1,84 @@
+"""Split-conformal prediction intervals stored in the model bundle."""
+import argparse
+import numpy as np
+from pathlib import Path
+
+DATA_DIR = Path("./data")
+COVERAGE = 0.9
+BINS = 5
+MIN_BIN_SIZE = 200
+
+
+def _conformal_quantile(values: np.ndarray, level: float) -> float:
+    # Finite-sample correction: the ceil((n + 1) * level)-th smallest value guarantees the level.
+    n = len(values)
+    rank = min(n, int(np.ceil((n + 1) * level)))
+    return float(np.partition(values, rank - 1)[rank - 1])
+
+
+def fit(y_true, y_pred, coverage: float = COVERAGE, bins: int = BINS, source: str = "oot") -> dict:
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    residuals = y_true - y_pred
+    bins = max(1, min(bins, len(residuals) // MIN_BIN_SIZE))
+    edges = np.quantile(y_pred, np.linspace(0, 1, bins + 1)[1:-1]) if bins > 1 else np.empty(0)
+    assigned = np.searchsorted(edges, y_pred, side="right")
+
+    tail = (1 - coverage) / 2
+    lower, upper = [], []
+    for b in range(bins):
+        bin_residuals = residuals[assigned == b]
+        lower.append(-_conformal_quantile(-bin_residuals, 1 - tail))
+        upper.append(_conformal_quantile(bin_residuals, 1 - tail))
+
+    return {
+        "method": "split-conformal", "source": source, "coverage": coverage, "rows": len(residuals),
+        "edges": [float(edge) for edge in edges], "lower": lower, "upper": upper,
+    }
+
+
+def offsets(spec: dict, y_pred):
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    assigned = np.searchsorted(np.asarray(spec["edges"], dtype=np.float64), y_pred, side="right")
+    return np.asarray(spec["lower"])[assigned], np.asarray(spec["upper"])[assigned]
+
+
+def evaluate(spec: dict, y_true, y_pred) -> dict:
+    # Empirical coverage on another split, and the median width as a fraction of the predicted price.
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    lower, upper = offsets(spec, y_pred)
+    covered = (y_true >= y_pred + lower) & (y_true <= y_pred + upper)
+    width = np.exp(upper) - np.exp(lower)
+    return {"coverage": float(covered.mean()), "median_relative_width": float(np.median(width))}
+
+
+def calibrate_bundle(model_path, split: str = "oot", coverage: float = COVERAGE, bins: int = BINS) -> dict:
+    # Adds intervals to an already trained bundle, e.g. one saved before they existed.
+    from bundle import load_bundle, write_manifest
+    from storage import find_split, read_frame
+
+    bundle = load_bundle(model_path)
+    path = find_split(DATA_DIR, split)
+    df = read_frame(path)
+    y_true = df.pop("price")
+    spec = fit(y_true, bundle.model.predict(df[bundle.feature_order]), coverage, bins, source=path.name)
+    write_manifest(Path(model_path), {**bundle.manifest, "intervals": spec})
+    return spec
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calibrate conformal prediction intervals for a model bundle.")
+    parser.add_argument("--model", default="./models/bundle")
+    parser.add_argument("--split", default="oot", help="held-out split the residuals come from")
+    parser.add_argument("--coverage", type=float, default=COVERAGE)
+    parser.add_argument("--bins", type=int, default=BINS, help="bins by predicted price, each with its own offsets")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    spec = calibrate_bundle(args.model, args.split, args.coverage, args.bins)
+    print(f"{spec['coverage']:.0%} intervals from {spec['rows']} rows of {spec['source']} written to {args.model}")
+    for b, (lower, upper) in enumerate(zip(spec["lower"], spec["upper"])):
+        print(f"  bin {b}: {np.exp(lower) - 1:+.1%} / {np.exp(upper) - 1:+.1%}")
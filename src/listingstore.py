@@ -0,0 +1,129 @@
+import sqlite3
+import argparse
+import pandas as pd
+from pathlib import Path
+from storage import write_frame
+
+STORE_PATH = Path("data") / "listings.db"
+LISTING_COLUMNS = ["address", "latitude", "longitude", "area", "rooms", "floor", "max_floor",
+                   "category", "repaired", "receipt", "mortgage", "price"]
+CHUNK_SIZE = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id TEXT NOT NULL,
+    scrape_date TEXT NOT NULL,
+    url TEXT,
+    address TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    area INTEGER NOT NULL,
+    rooms INTEGER NOT NULL,
+    floor INTEGER NOT NULL,
+    max_floor INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    repaired INTEGER NOT NULL,
+    receipt INTEGER NOT NULL,
+    mortgage INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    PRIMARY KEY (listing_id, scrape_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_listings_scrape_date ON listings (scrape_date, listing_id);
+"""
+
+
+class ListingStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upsert(self, df: pd.DataFrame, scrape_date: str) -> int:
+        columns = ["listing_id", "url", *LISTING_COLUMNS]
+        frame = df.reindex(columns=columns)
+        frame = frame.astype(object).where(frame.notna(), None)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns[1:])
+        statement = (f"INSERT INTO listings (scrape_date, {', '.join(columns)}) "
+                     f"VALUES (?, {', '.join('?' for _ in columns)}) "
+                     f"ON CONFLICT (listing_id, scrape_date) DO UPDATE SET {updates}")
+
+        rows = ((scrape_date, *row) for row in frame.itertuples(index=False, name=None))
+        with self.connection:
+            self.connection.executemany(statement, rows)
+        return len(frame)
+
+    def _latest_query(self, start, end, new_only: bool):
+        # Latest snapshot of every listing seen in [start, end); with new_only, only listings
+        # whose first snapshot falls inside the range, so OOT never overlaps earlier batches.
+        conditions, params = [], []
+        if start:
+            conditions.append("scrape_date >= ?")
+            params.append(start)
+        if end:
+            conditions.append("scrape_date < ?")
+            params.append(end)
+        window = " AND ".join(conditions) or "1 = 1"
+
+        query = (f"SELECT l.listing_id, l.scrape_date, l.url, {', '.join(f'l.{c}' for c in LISTING_COLUMNS)} "
+                 f"FROM listings l JOIN (SELECT listing_id, MAX(scrape_date) AS scrape_date "
+                 f"FROM listings WHERE {window} GROUP BY listing_id) latest "
+                 f"USING (listing_id, scrape_date)")
+        if new_only and start:
+            query += " WHERE NOT EXISTS (SELECT 1 FROM listings p WHERE p.listing_id = l.listing_id AND p.scrape_date < ?)"
+            params = params + [start]
+        return query, params
+
+    def query(self, start: str = None, end: str = None, new_only: bool = False) -> pd.DataFrame:
+        query, params = self._latest_query(start, end, new_only)
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def iter_query(self, start: str = None, end: str = None, new_only: bool = False, chunk_size: int = CHUNK_SIZE):
+        query, params = self._latest_query(start, end, new_only)
+        yield from pd.read_sql_query(query, self.connection, params=params, chunksize=chunk_size)
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(DISTINCT listing_id) FROM listings").fetchone()[0]
+
+    def snapshot_count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def scrape_dates(self) -> list:
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT scrape_date FROM listings ORDER BY 1")]
+
+    def export_splits(self, oot_from: str, folder="data") -> tuple:
+        folder = Path(folder)
+        data = self.query(end=oot_from)
+        oot = self.query(start=oot_from, new_only=True)
+        return write_frame(data, folder / "data.parquet"), write_frame(oot, folder / "oot.parquet")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Inspect the listing store or export training splits from it.")
+    parser.add_argument("--store", default=str(STORE_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show listing and snapshot counts")
+    export = commands.add_parser("export", help="write data.parquet and oot.parquet for train.py")
+    export.add_argument("--oot-from", required=True, help="first scrape date (YYYY-MM-DD) of the OOT window")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with ListingStore(args.store) as store:
+        if args.command == "stats":
+            print(f"{store.count()} listings, {store.snapshot_count()} snapshots")
+            print(f"Scrape dates: {', '.join(store.scrape_dates())}")
+        else:
+            data_path, oot_path = store.export_splits(args.oot_from)
+            print(f"Exported {data_path} and {oot_path}")
@@ -0,0 +1,142 @@
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Latency targets for /predict measured client-side, with one concurrent client per server worker.
+TARGET_P50_MS = 10.0
+TARGET_P99_MS = 50.0
+
+DISTRICTS = ["nəsimi m.", "yasamal r.", "xətai r.", "nərimanov r.", "binəqədi q.", "28 may m."]
+
+
+def random_listing(rng: random.Random) -> dict:
+    rooms = rng.randint(1, 5)
+    max_floor = rng.randint(2, 25)
+    return {
+        "address": rng.choice(DISTRICTS),
+        "latitude": rng.uniform(40.35, 40.45), "longitude": rng.uniform(49.75, 49.95),
+        "area": rng.randint(25 * rooms, 45 * rooms), "rooms": rooms,
+        "floor": rng.randint(1, max_floor), "max_floor": max_floor,
+        "category": rng.randint(0, 1), "repaired": rng.randint(0, 1),
+    }
+
+
+def run_client(url: str, n_requests: int, seed: int) -> list:
+    target = urlparse(url)
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80)
+    headers = {"Content-Type": "application/json"}
+    latencies = []
+
+    for _ in range(n_requests):
+        body = json.dumps(random_listing(rng))
+        start = time.perf_counter()
+        connection.request("POST", "/predict", body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f"/predict returned {response.status}")
+
+    connection.close()
+    return latencies
+
+
+def wait_until_ready(url: str, timeout: float = 60.0, server: subprocess.Popen = None):
+    target = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        # A spawned server that died (e.g. failed to bind) must not leave us testing someone else's.
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} before becoming ready")
+        try:
+            connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Service at {url} did not become ready in {timeout:.0f}s")
+
+
+def port_in_use(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        return sock.connect_ex((host, port)) == 0
+
+
+def spawn_server(url: str, workers: int):
+    # stderr goes to a temp file rather than a pipe nobody drains during the run.
+    target = urlparse(url)
+    command = [sys.executable, "-m", "uvicorn", "api:app", "--app-dir", "src", "--host", target.hostname,
+               "--port", str(target.port), "--workers", str(workers), "--log-level", "warning"]
+    log = tempfile.TemporaryFile()
+    return subprocess.Popen(command, stderr=log), log
+
+
+def load_test(url: str, n_requests: int, concurrency: int, warmup: int = 50) -> dict:
+    run_client(url, warmup, seed=-1)
+
+    per_client = max(1, n_requests // concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = pool.map(run_client, [url] * concurrency, [per_client] * concurrency, range(concurrency))
+        latencies = np.concatenate([np.asarray(r) for r in results]) * 1000
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies), "concurrency": concurrency, "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check /predict latency against the p50/p99 targets.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, help="concurrent clients, defaults to --workers")
+    parser.add_argument("--spawn", action="store_true", help="start a local uvicorn server for the run")
+    parser.add_argument("--workers", type=int, default=1, help="server workers when --spawn is used")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    target = urlparse(args.url)
+    if args.spawn and port_in_use(target.hostname, target.port or 80):
+        sys.exit(f"Port {target.port} on {target.hostname} is already in use; stop that process or pick another --url")
+
+    server, server_log = spawn_server(args.url, args.workers) if args.spawn else (None, None)
+    try:
+        wait_until_ready(args.url, server=server)
+        stats = load_test(args.url, args.requests, args.concurrency or args.workers)
+    except RuntimeError as error:
+        stderr = ""
+        if server_log is not None:
+            server_log.seek(0)
+            stderr = server_log.read().decode("utf-8", errors="replace")
+        sys.exit(f"❌ {error}\n{stderr}".rstrip())
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"{stats['requests']} requests, concurrency {stats['concurrency']}, {stats['rps']:.0f} req/s")
+    print(f"p50: {stats['p50_ms']:.2f} ms (target {TARGET_P50_MS} ms)")
+    print(f"p99: {stats['p99_ms']:.2f} ms (target {TARGET_P99_MS} ms)")
+
+    if stats["p50_ms"] > TARGET_P50_MS or stats["p99_ms"] > TARGET_P99_MS:
+        print("❌ Latency target missed")
+        sys.exit(1)
+    print("✅ Latency target met")
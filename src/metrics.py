@@ -0,0 +1,203 @@
+"""In-process metrics and opt-in profiling for the prediction and data pipelines."""
+import os
+import time
+import bisect
+import cProfile
+import threading
+import functools
+from pathlib import Path
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, 30.0, 60.0)
+STAGE_HISTOGRAM = "hpp_stage_seconds"
+STAGE_ERRORS = "hpp_stage_errors_total"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PROFILE_EVERY = int(os.environ.get("HPP_PROFILE_EVERY", "0"))
+PROFILE_DIR = Path(os.environ.get("HPP_PROFILE_DIR", "profiles"))
+PROFILER = os.environ.get("HPP_PROFILER", "cprofile")
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+                self.help.setdefault(name, help)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for metric_type, series in (("counter", self.counters), ("histogram", self.histograms)):
+                for name in sorted({name for name, _ in series}):
+                    if self.help.get(name):
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name != name:
+                            continue
+                        if metric_type == "counter":
+                            lines.append(f"{name}{_label_text(labels)} {value}")
+                            continue
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                            cumulative += count
+                            le = "+Inf" if bound == float("inf") else repr(bound)
+                            lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+                        lines.append(f"{name}_sum{_label_text(labels)} {value.sum}")
+                        lines.append(f"{name}_count{_label_text(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        stages = {}
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                stages[dict(labels).get("stage", name)] = {"count": histogram.count, "seconds": histogram.sum}
+        return stages
+
+
+REGISTRY = Registry()
+
+
+class timed:
+    # Usable as ``with timed("stage"):`` or as ``@timed("stage")``.
+    def __init__(self, stage: str, registry: Registry = REGISTRY):
+        self.stage = stage
+        self.registry = registry
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self.start, self.registry)
+        if exc_type is not None:
+            self.registry.inc(STAGE_ERRORS, help="Stages that raised an exception.", stage=self.stage)
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, self.registry):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def observe(stage: str, seconds: float, registry: Registry = REGISTRY):
+    registry.observe(STAGE_HISTOGRAM, seconds, help="Wall-clock seconds spent per pipeline stage.", stage=stage)
+
+
+def render(registry: Registry = REGISTRY) -> str:
+    return registry.render()
+
+
+def _dump_profile(name: str, call: int, function, args, kwargs):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{name}-{datetime.now():%Y%m%d-%H%M%S}-{call}"
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.stop()
+                stem.with_suffix(".html").write_text(profiler.output_html(), encoding="utf-8")
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(stem.with_suffix(".prof"))
+
+
+def profiled(name: str):
+    # Profile every PROFILE_EVERY-th call; a no-op wrapper when profiling is off.
+    def decorator(function):
+        if PROFILE_EVERY <= 0:
+            return function
+        calls = [0]
+        lock = threading.Lock()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with lock:
+                calls[0] += 1
+                call = calls[0]
+            if call % PROFILE_EVERY:
+                return function(*args, **kwargs)
+            return _dump_profile(name, call, function, args, kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_from_env():
+    port = os.environ.get("HPP_METRICS_PORT")
+    if not port:
+        return None
+    server = serve(int(port))
+    print(f"Serving metrics at http://127.0.0.1:{port}/metrics")
+    return server
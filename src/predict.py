@@ -1,47 +1,80 @@
 import pickle
 import numpy as np
-from geopy.distance import geodesic
+from metrics import profiled, timed
+from concurrent.futures import Future, ThreadPoolExecutor
+from geogrid import GeoGrid
+from intervals import offsets
+from georeference import load_reference
+from bundle import CAT_FEATURES, FEATURE_DTYPES, FEATURE_ORDER, TRANSFORMS, is_bundle, load_bundle
+
+# pandas is imported by the batch paths only, so importing this module stays cheap for the single-row path.
+
+INPUT_COLUMNS = ['address', 'latitude', 'longitude', 'area', 'rooms', 'floor', 'max_floor', 'category', 'repaired']
+CHUNK_SIZE = 10000
+# Fallback band for models without calibrated intervals in their bundle.
+PRICE_BAND = 0.10
+WARMUP_INPUT = {'address': 'warmup', 'area': 60, 'rooms': 2, 'floor': 3, 'max_floor': 9, 'category': 1, 'repaired': 1}
 
 class Predictor:
-    def __init__(self, model_path: str):
-        self.city_center_coords = (40.39271412682096, 49.85914227549446)
-        self.metro_coords = {"Hazi Aslanov":(40.373051773671946, 49.95349983629199), "Ahmadli":(40.385681694123875, 49.95412197020865),
-                             "Khalglar Dostlughu":(40.397718265050216, 49.95247536010498), "Neftchiler":(40.41063242845042, 49.944637877423325),
-                             "Gara Garayev":(40.41809596280599, 49.93369341348435), "Koroghlu":(40.42174982383615, 49.91682899603657),
-                             "Ulduz":(40.4154246911567, 49.89281080952932), "Nariman Narimanov":(40.402894979596034, 49.87063598949156),
-                             "Bakmil":(40.414212501973225, 49.87926209603625), "Ganjlik":(40.4006505725387, 49.85152358947007),
-                             "28 May":(40.380070538430836, 49.84854200952747), "Sahil":(40.371777336086275, 49.84403189603394),
-                             "Icherisheher":(40.36591670244111, 49.83163125130865), "Khatai":(40.383200385960194, 49.87192180952767),
-                             "Nizami":(40.37952555022259, 49.829866236562566), "Elmler Akademiyasi":(40.37561857223014, 49.81469909603425),
-                             "Inshaatchilar":(40.390291928965276, 49.802691380145696), "20 Yanvar":(40.40416714136188, 49.80781001062231),
-                             "Memar Ajami":(40.41066349361367, 49.813622996036), "8 Noyabr":(40.401926268998125, 49.82088033336266),
-                             "Avtovagzhal":(40.42152882429223, 49.795038267200965), "Khojasan":(40.42127765054647, 49.778951340214846),
-                             "Nasimi":(40.42450930633489, 49.82513056884164), "Azadlig Prospekti":(40.42597278055359, 49.841742796036826),
-                             "Darnagul":(40.42550780020771, 49.86194644042418)}
-        self.model = self._load_model(model_path)
+    def __init__(self, model_path: str, grid_path: str = None):
+        if is_bundle(model_path):
+            bundle = load_bundle(model_path)
+            self.model = bundle.model
+            self.version = bundle.version
+            self.reference = bundle.reference()
+            self.feature_order = bundle.feature_order
+            self.cat_features = bundle.cat_features
+            self.transforms = bundle.transforms
+            self.intervals = bundle.intervals
+        else:
+            self.model = self._load_model(model_path)
+            self.version = None
+            self.reference = load_reference()
+            self.feature_order = FEATURE_ORDER
+            self.cat_features = CAT_FEATURES
+            self.transforms = TRANSFORMS
+            self.intervals = None
+        # Optional precomputed location grid (see geogrid.py); must match this model's stations.
+        self.grid = GeoGrid(grid_path, self.reference) if grid_path else None
 
     def _load_model(self, path: str):
         with open(path, 'rb') as file:
             return pickle.load(file)
 
+    def _transform(self, name: str, value):
+        if name in self.transforms['log']:
+            return np.log(value)
+        power = self.transforms['power'].get(name)
+        return value if power is None else value ** power
+
+    def _to_price(self, prediction):
+        return np.exp(prediction) if 'price' in self.transforms['log'] else prediction
+
     def _calculate_distance_from_center(self, coords: tuple) -> float:
-        return geodesic(coords, self.city_center_coords).m
+        return float(self.reference.distance_from_center(*coords))
 
     def _get_nearest_metro_info(self, user_coords: tuple):
-        distances = {
-            name: geodesic(user_coords, coords).m
-            for name, coords in self.metro_coords.items()
-        }
-        nearest_metro = min(distances, key=distances.get)
-        return nearest_metro.lower(), distances[nearest_metro]
+        names, distances = self.reference.nearest_metro(*user_coords)
+        return names[0], float(distances[0])
+
+    def _location_features(self, coords: tuple):
+        if self.grid is not None:
+            with timed("predict.geogrid"):
+                distance_from_center, metro_idx, distance_to_nearest_metro = self.grid.lookup_one(*coords)
+            return distance_from_center, self.reference.metro_names[metro_idx], distance_to_nearest_metro
+
+        with timed("predict.distance_from_center"):
+            distance_from_center = self._calculate_distance_from_center(coords)
+        with timed("predict.nearest_metro"):
+            nearest_metro, distance_to_nearest_metro = self._get_nearest_metro_info(coords)
+        return distance_from_center, nearest_metro, distance_to_nearest_metro
 
     def _preprocess_input(self, input_data: dict) -> dict:
         latitude = input_data['latitude']
         longitude = input_data['longitude']
         coords = (latitude, longitude)
 
-        distance_from_center = self._calculate_distance_from_center(coords)
-        nearest_metro, distance_to_nearest_metro = self._get_nearest_metro_info(coords)
+        distance_from_center, nearest_metro, distance_to_nearest_metro = self._location_features(coords)
 
         area = input_data['area']
         rooms = input_data['rooms']
@@ -51,25 +84,139 @@ class Predictor:
         processed = {
             'address': input_data['address'].lower(),
             'latitude': latitude, 'longitude': longitude,
-            'distance_from_center': distance_from_center ** 0.25,
+            'distance_from_center': self._transform('distance_from_center', distance_from_center),
             'nearest_metro': nearest_metro,
-            'distance_to_nearest_metro': distance_to_nearest_metro ** 0.25,
-            'area': np.log(area), 'rooms': rooms, 'area_per_room': area / rooms,
+            'distance_to_nearest_metro': self._transform('distance_to_nearest_metro', distance_to_nearest_metro),
+            'area': self._transform('area', area), 'rooms': rooms, 'area_per_room': area / rooms,
             'floor': floor, 'max_floor': max_floor, 'floor_ratio': floor / max_floor,
             'category': input_data['category'], 'repaired': input_data['repaired'],
         }
 
         return processed
 
+    def _preprocess_frame(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        import pandas as pd
+
+        latitude = df['latitude'].to_numpy(dtype=np.float64)
+        longitude = df['longitude'].to_numpy(dtype=np.float64)
+        area = df['area'].to_numpy(dtype=np.float64)
+        rooms = df['rooms'].to_numpy()
+        floor = df['floor'].to_numpy()
+        max_floor = df['max_floor'].to_numpy()
+
+        if self.grid is not None:
+            distance_from_center, metro_idx, distance_to_nearest_metro = self.grid.lookup(latitude, longitude)
+            nearest_metro = self.reference.metro_names[metro_idx]
+        else:
+            distance_from_center = self.reference.distance_from_center(latitude, longitude)
+            nearest_metro, distance_to_nearest_metro = self.reference.nearest_metro(latitude, longitude)
+
+        processed = pd.DataFrame({
+            'address': df['address'].str.lower().to_numpy(),
+            'latitude': latitude, 'longitude': longitude,
+            'distance_from_center': self._transform('distance_from_center', distance_from_center),
+            'nearest_metro': pd.Categorical(nearest_metro, categories=self.reference.metro_names),
+            'distance_to_nearest_metro': self._transform('distance_to_nearest_metro', distance_to_nearest_metro),
+            'area': self._transform('area', area), 'rooms': rooms, 'area_per_room': area / rooms,
+            'floor': floor, 'max_floor': max_floor, 'floor_ratio': floor / max_floor,
+            'category': df['category'].to_numpy(), 'repaired': df['repaired'].to_numpy(),
+        })
+
+        # Integer features go to float32 rather than int16/int8 so missing values still score.
+        dtypes = {col: 'category' if col in self.cat_features else
+                  FEATURE_DTYPES[col] if FEATURE_DTYPES.get(col, 'float64').startswith('float') else 'float32'
+                  for col in self.feature_order}
+        return processed[self.feature_order].astype(dtypes, copy=False)
+
+    def _interval(self, prediction):
+        # Bounds for raw model outputs: one lookup of the calibrated offsets per row.
+        prediction = np.asarray(prediction, dtype=np.float64)
+        if self.intervals is None:
+            price = self._to_price(prediction)
+            return price * (1 - PRICE_BAND), price * (1 + PRICE_BAND)
+        lower, upper = offsets(self.intervals, prediction)
+        return self._to_price(prediction + lower), self._to_price(prediction + upper)
+
+    def _predict_raw(self, user_input: dict) -> float:
+        with timed("predict.preprocess"):
+            processed = self._preprocess_input(user_input)
+
+        input_for_model = [processed[feat] for feat in self.feature_order]
+
+        with timed("predict.model"):
+            return self.model.predict([input_for_model])[0]
+
+    @profiled("predict")
+    @timed("predict")
     def predict(self, user_input: dict) -> float:
-        processed = self._preprocess_input(user_input)
-
-        feature_order = [
-            'address', 'latitude', 'longitude', 'distance_from_center', 'nearest_metro',
-            'distance_to_nearest_metro', 'area', 'rooms', 'area_per_room', 'floor',
-            'max_floor', 'floor_ratio', 'category', 'repaired'
-        ]
-        input_for_model = [processed[feat] for feat in feature_order]
-        
-        log_price = self.model.predict([input_for_model])[0]
-        return np.exp(log_price)
\ No newline at end of file
+        return self._to_price(self._predict_raw(user_input))
+
+    @profiled("predict")
+    @timed("predict")
+    def predict_with_interval(self, user_input: dict) -> tuple:
+        raw = self._predict_raw(user_input)
+        lower, upper = self._interval([raw])
+        return self._to_price(raw), float(lower[0]), float(upper[0])
+
+    def _predict_frame_raw(self, df: "pd.DataFrame") -> np.ndarray:
+        from catboost import Pool
+
+        with timed("predict_frame.preprocess"):
+            processed = self._preprocess_frame(df)
+        with timed("predict_frame.model"):
+            pool = Pool(processed, cat_features=self.cat_features)
+            return self.model.predict(pool)
+
+    def predict_frame(self, df: "pd.DataFrame") -> np.ndarray:
+        return self._to_price(self._predict_frame_raw(df))
+
+    def _predict_many_raw(self, rows, chunk_size: int) -> np.ndarray:
+        import pandas as pd
+
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows, columns=INPUT_COLUMNS)
+        predictions = np.empty(len(df), dtype=np.float64)
+
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            predictions[start:start + len(chunk)] = self._predict_frame_raw(chunk)
+
+        return predictions
+
+    @profiled("predict_many")
+    @timed("predict_many")
+    def predict_many(self, rows, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+        return self._to_price(self._predict_many_raw(rows, chunk_size))
+
+    @profiled("predict_many")
+    @timed("predict_many")
+    def predict_many_with_intervals(self, rows, chunk_size: int = CHUNK_SIZE) -> tuple:
+        raw = self._predict_many_raw(rows, chunk_size)
+        lower, upper = self._interval(raw)
+        return self._to_price(raw), lower, upper
+
+    def warmup(self):
+        # One dummy inference through the single and batch paths imports the lazily loaded
+        # modules, builds the station tree and primes CatBoost before the first real request.
+        # It calls the model directly so the dummy row stays out of the predict histograms.
+        latitude, longitude = self.reference.city_center_coords
+        import pandas as pd
+
+        sample = {**WARMUP_INPUT, 'latitude': latitude, 'longitude': longitude}
+        with timed("predict.warmup"):
+            processed = self._preprocess_input(sample)
+            self._interval(self.model.predict([[processed[feat] for feat in self.feature_order]]))
+            self.predict_frame(pd.DataFrame([sample], columns=INPUT_COLUMNS))
+        return self
+
+
+def _load_warm(factory, model_path: str, kwargs: dict):
+    return factory(model_path, **kwargs).warmup()
+
+
+def load_in_background(model_path: str, factory=Predictor, **kwargs) -> Future:
+    # Loads and warms a predictor on a worker thread so the caller can keep starting up;
+    # .result() blocks only if the first prediction is needed before it is ready.
+    executor = ThreadPoolExecutor(1, thread_name_prefix="predictor-warmup")
+    future = executor.submit(_load_warm, factory, model_path, kwargs)
+    executor.shutdown(wait=False)
+    return future
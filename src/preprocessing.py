@@ -1,74 +1,97 @@
+import geo
+import inspect
+import georeference
 import pandas as pd
-from tqdm import tqdm
 from pathlib import Path
-from geopy.distance import geodesic
+from bundle import FEATURE_DTYPES
+from metrics import timed
+from georeference import load_reference
+from storage import read_frame, resolve
+from featurecache import FEATURE_INPUTS, FeatureCache, hash_file, hash_params
+
+FEATURE_VERSION = 1
+CACHE_DIR = Path("data") / "cache" / "features"
+# Identity columns from DatasetCleaner and the listing store; url is empty for legacy dumps.
+ID_COLUMNS = ["listing_id", "url", "scrape_date"]
 
 class Preprocessor:
     def __init__(self):
         self.df = None
         self.data_path = Path("data")
-        self.city_center_coords = (40.39271412682096, 49.85914227549446)
-        self.underground_coords = {"Hazi Aslanov":(40.373051773671946, 49.95349983629199), "Ahmadli":(40.385681694123875, 49.95412197020865),
-                                   "Khalglar Dostlughu":(40.397718265050216, 49.95247536010498), "Neftchiler":(40.41063242845042, 49.944637877423325),
-                                   "Gara Garayev":(40.41809596280599, 49.93369341348435), "Koroghlu":(40.42174982383615, 49.91682899603657),
-                                   "Ulduz":(40.4154246911567, 49.89281080952932), "Nariman Narimanov":(40.402894979596034, 49.87063598949156),
-                                   "Bakmil":(40.414212501973225, 49.87926209603625), "Ganjlik":(40.4006505725387, 49.85152358947007),
-                                   "28 May":(40.380070538430836, 49.84854200952747), "Sahil":(40.371777336086275, 49.84403189603394),
-                                   "Icherisheher":(40.36591670244111, 49.83163125130865), "Khatai":(40.383200385960194, 49.87192180952767),
-                                   "Nizami":(40.37952555022259, 49.829866236562566), "Elmler Akademiyasi":(40.37561857223014, 49.81469909603425),
-                                   "Inshaatchilar":(40.390291928965276, 49.802691380145696), "20 Yanvar":(40.40416714136188, 49.80781001062231),
-                                   "Memar Ajami":(40.41066349361367, 49.813622996036), "8 Noyabr":(40.401926268998125, 49.82088033336266),
-                                   "Avtovagzhal":(40.42152882429223, 49.795038267200965), "Khojasan":(40.42127765054647, 49.778951340214846),
-                                   "Nasimi":(40.42450930633489, 49.82513056884164), "Azadlig Prospekti":(40.42597278055359, 49.841742796036826),
-                                   "Darnagul":(40.42550780020771, 49.86194644042418)}
-
-    def read_data(self, filename: str):
-        file_path = self.data_path / filename
-        self.df = pd.read_excel(file_path)
+        self.reference = load_reference()
+
+    @timed("preprocess.read")
+    def read_data(self, filename: str, memory_map: bool = False):
+        file_path = resolve(self.data_path, filename)
+        self.df = read_frame(file_path, memory_map=memory_map)
+
+    def cache_key(self) -> str:
+        # Fingerprints the cleaning/feature code, output dtypes and distance code, so editing any
+        # of them starts a fresh cache instead of reusing stale features.
+        code = [inspect.getsource(item) for item in (Preprocessor, geo, georeference)]
+        return hash_params(FEATURE_VERSION, code, FEATURE_INPUTS, FEATURE_DTYPES, self.reference.to_dict())
 
+    @timed("preprocess.clean")
     def clean_data(self):
+        self.df.drop(columns=ID_COLUMNS, errors="ignore", inplace=True)
         self.df.dropna(inplace=True)
         self.df.drop_duplicates(inplace=True)
 
-    def feature_engineering(self):
-        self.df["floor_ratio"] = self.df["floor"] / self.df["max_floor"]
+    def derive_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        derived = pd.DataFrame(index=df.index)
+        derived["floor_ratio"] = (df["floor"] / df["max_floor"]).astype(FEATURE_DTYPES["floor_ratio"])
 
-        self.df['distance_from_center'] = self.df.apply(lambda row: geodesic((row['latitude'], row['longitude']), self.city_center_coords).m, axis=1)
+        derived['distance_from_center'] = self.reference.distance_from_center(df['latitude'], df['longitude'])
 
-        self.df["area_per_room"] = self.df["area"] / self.df["rooms"]
+        derived["area_per_room"] = (df["area"] / df["rooms"]).astype(FEATURE_DTYPES["area_per_room"])
 
-        distances = []
-        metros = []
-        for _, row in tqdm(self.df.iterrows(), total=len(self.df), desc="Calculating distances"):
-            user_coords = (row['latitude'], row['longitude'])
-            min_dist = float("inf")
-            nearest_station = None
+        nearest_metro, nearest_dist = self.reference.nearest_metro(df['latitude'], df['longitude'])
 
-            for name, coords in self.underground_coords.items():
-                dist = geodesic(user_coords, coords).m
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest_station = name
+        derived['distance_to_nearest_metro'] = nearest_dist
+        derived['nearest_metro'] = pd.Categorical(nearest_metro, categories=self.reference.metro_names)
+        return derived
 
-            distances.append(min_dist)
-            metros.append(nearest_station.lower())
+    @timed("preprocess.features")
+    def feature_engineering(self, cache: FeatureCache = None, tag: str = ""):
+        if cache is None:
+            derived = self.derive_features(self.df)
+        else:
+            derived = cache.derive(self.df, self.derive_features, tag)
 
-        self.df['distance_to_nearest_metro'] = distances
-        self.df['nearest_metro'] = metros
+        for col in derived.columns:
+            self.df[col] = derived[col]
 
         self.df.drop(columns=['mortgage', 'receipt'], inplace=True)
 
+    @timed("preprocess.select")
     def select_features(self):
         self.df = self.df[[ 
             'address', 'latitude', 'longitude', 'distance_from_center',
             'nearest_metro', 'distance_to_nearest_metro', 'area', 'rooms',
             'area_per_room', 'floor', 'max_floor', 'floor_ratio', 'category',
             'repaired', 'price'
-        ]]
+        ]].astype(FEATURE_DTYPES, copy=False)
+
+    def process(self, filename: str, use_cache: bool = True):
+        if not use_cache:
+            self.read_data(filename)
+            self.clean_data()
+            self.feature_engineering()
+            self.select_features()
+            return self.df
+
+        with timed("preprocess.cache_lookup"):
+            file_hash = hash_file(resolve(self.data_path, filename))
+            cache = FeatureCache(CACHE_DIR, self.cache_key())
+            cached = cache.load_frame(file_hash)
+        if cached is not None:
+            print(f"Feature cache: {filename} unchanged, reusing features")
+            self.df = cached
+            return self.df
 
-    def process(self, filename: str):
         self.read_data(filename)
         self.clean_data()
-        self.feature_engineering()
+        self.feature_engineering(cache, file_hash)
         self.select_features()
+        cache.save_frame(file_hash, self.df)
         return self.df
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""Versioned model registry with hot reload and shadow scoring."""
+import os
+import json
+import time
+import queue
+import shutil
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+import metrics
+from bundle import is_bundle, read_manifest
+from predict import CHUNK_SIZE, INPUT_COLUMNS, Predictor
+
+REGISTRY_PATH = Path("models") / "registry"
+VERSIONS_DIR = "versions"
+POINTERS_FILE = "pointers.json"
+SHADOW_LOG = "shadow.jsonl"
+RELOAD_INTERVAL = 5.0
+# Calls waiting beyond this are dropped rather than queued, so a slow shadow model can never
+# build up memory or fall minutes behind live traffic.
+MAX_SHADOW_PENDING = 1024
+SHADOW_BATCH_WAIT = 0.2
+
+
+def is_registry(path) -> bool:
+    return (Path(path) / POINTERS_FILE).is_file()
+
+
+class ModelRegistry:
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = Path(path)
+
+    def version_path(self, version: str) -> Path:
+        return self.path / VERSIONS_DIR / version
+
+    def versions(self) -> list:
+        folder = self.path / VERSIONS_DIR
+        if not folder.is_dir():
+            return []
+        return sorted(path.name for path in folder.iterdir() if is_bundle(path))
+
+    def pointers(self) -> dict:
+        try:
+            with open(self.path / POINTERS_FILE, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"active": None, "shadow": None}
+
+    def _write_pointers(self, pointers: dict):
+        for key in ("active", "shadow"):
+            version = pointers.get(key)
+            if version is not None and version not in self.versions():
+                raise ValueError(f"Version {version!r} is not in the registry at {self.path}")
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path / f".{POINTERS_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({**pointers, "updated_at": datetime.now().isoformat(timespec="seconds")}, file, indent=2)
+        os.replace(tmp_path, self.path / POINTERS_FILE)
+
+    def publish(self, bundle_path, activate: bool = False, shadow: bool = False) -> str:
+        version = read_manifest(bundle_path)["version"]
+        target = self.version_path(version)
+        if target.exists():
+            raise FileExistsError(f"Version {version} is already published in {self.path}")
+
+        # Copy next to the target and rename, so a half-copied bundle is never visible.
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{version}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.copytree(bundle_path, tmp_path)
+        os.replace(tmp_path, target)
+
+        pointers = self.pointers()
+        if activate or pointers["active"] is None:
+            pointers["active"] = version
+        elif shadow:
+            pointers["shadow"] = version
+        self._write_pointers(pointers)
+        return version
+
+    def activate(self, version: str):
+        pointers = self.pointers()
+        if pointers.get("shadow") == version:
+            pointers["shadow"] = None
+        self._write_pointers({**pointers, "active": version})
+
+    def set_shadow(self, version: str = None):
+        self._write_pointers({**self.pointers(), "shadow": version})
+
+    def active_path(self) -> Path:
+        version = self.pointers()["active"]
+        if version is None:
+            raise FileNotFoundError(f"No active model in {self.path}")
+        return self.version_path(version)
+
+
+def resolve_model_path(path) -> Path:
+    # A registry stands for its active bundle wherever a plain model path is accepted.
+    return ModelRegistry(path).active_path() if is_registry(path) else Path(path)
+
+
+class ShadowScorer:
+    # Requests are queued and scored together: one predict_many over everything that arrived
+    # since the last pass costs far less CPU than re-running each single-row prediction.
+    def __init__(self, log_path: Path):
+        self.log_path = log_path
+        self.queue = queue.Queue(MAX_SHADOW_PENDING)
+        self.thread = threading.Thread(target=self._run, name="shadow", daemon=True)
+        self.thread.start()
+
+    def submit(self, shadow: Predictor, active_version: str, rows, predicted: np.ndarray):
+        try:
+            self.queue.put_nowait((shadow, active_version, rows, predicted))
+        except queue.Full:
+            metrics.REGISTRY.inc("hpp_shadow_dropped_total", help="Shadow batches dropped because the queue was full.")
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            time.sleep(SHADOW_BATCH_WAIT)
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in items
+            groups = {}
+            for item in items:
+                if item is not None:
+                    groups.setdefault((item[0], item[1]), []).append(item)
+            for (shadow, active_version), group in groups.items():
+                self._score(shadow, active_version, group)
+            if stop:
+                return
+
+    def _score(self, shadow: Predictor, active_version: str, group: list):
+        try:
+            frames = [rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows, columns=INPUT_COLUMNS)
+                      for _, _, rows, _ in group]
+            predicted = np.concatenate([item[3] for item in group])
+            with metrics.timed("shadow.predict"):
+                shadow_predicted = shadow.predict_many(pd.concat(frames, ignore_index=True))
+            delta = shadow_predicted - predicted
+            relative = np.abs(delta) / predicted
+            metrics.REGISTRY.observe("hpp_shadow_relative_delta", float(relative.mean()),
+                                     help="Mean relative difference between shadow and active predictions per pass.")
+            record = {
+                "time": datetime.now().isoformat(timespec="milliseconds"),
+                "active": active_version, "shadow": shadow.version, "calls": len(group), "rows": len(delta),
+                "mean_delta": float(delta.mean()), "mean_abs_pct": float(relative.mean()),
+                "max_abs_pct": float(relative.max()),
+            }
+            # One short line per append, so records from several API workers do not interleave.
+            with open(self.log_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+        except Exception as exc:
+            metrics.REGISTRY.inc("hpp_shadow_errors_total", help="Shadow scoring passes that raised.")
+            print(f"Shadow model {shadow.version} failed: {exc!r}")
+
+    def drain(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class LivePredictor:
+    def __init__(self, registry_path=REGISTRY_PATH, grid_path: str = None, reload_interval: float = RELOAD_INTERVAL,
+                 shadow: bool = True):
+        self.registry = ModelRegistry(registry_path)
+        self.grid_path = grid_path
+        self.reload_interval = reload_interval
+        self.shadow_enabled = shadow
+        self.current = None
+        self.shadow = None
+        self.shadow_scorer = ShadowScorer(self.registry.path / SHADOW_LOG)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.reload()
+        if reload_interval > 0:
+            threading.Thread(target=self._watch, name="registry-watch", daemon=True).start()
+
+    def _load(self, version: str) -> Predictor:
+        with metrics.timed("registry.load"):
+            return Predictor(str(self.registry.version_path(version)), grid_path=self.grid_path).warmup()
+
+    def reload(self) -> bool:
+        # Loads whatever the pointers name and swaps it in; returns whether anything changed.
+        with self._reload_lock:
+            pointers = self.registry.pointers()
+            changed = False
+            if self.current is None or pointers["active"] != self.current.version:
+                if pointers["active"] is None:
+                    raise FileNotFoundError(f"No active model in {self.registry.path}")
+                if self.shadow is not None and self.shadow.version == pointers["active"]:
+                    current = self.shadow
+                else:
+                    current = self._load(pointers["active"])
+                previous, self.current = self.current, current
+                changed = True
+                print(f"Serving model {current.version}" + (f" (was {previous.version})" if previous else ""))
+
+            shadow_version = pointers.get("shadow") if self.shadow_enabled else None
+            if shadow_version is None:
+                changed |= self.shadow is not None
+                self.shadow = None
+            elif self.shadow is None or self.shadow.version != shadow_version:
+                self.shadow = self._load(shadow_version)
+                changed = True
+                print(f"Shadow scoring with model {shadow_version}")
+            return changed
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as exc:
+                # Keep serving the loaded model; a broken publish must not take the service down.
+                metrics.REGISTRY.inc("hpp_registry_reload_errors_total", help="Failed model reloads.")
+                print(f"Model reload from {self.registry.path} failed: {exc!r}")
+
+    def close(self):
+        self._stop.set()
+        self.shadow_scorer.drain()
+
+    def __getattr__(self, name):
+        # Everything else (version, reference, feature_order, ...) comes from the active predictor.
+        return getattr(self.current, name)
+
+    def warmup(self):
+        return self
+
+    def _shadow(self, current: Predictor, shadow: Predictor, rows, predictions: np.ndarray):
+        if shadow is None:
+            return
+        # Callers may add columns to their frame afterwards, so the shadow gets its own copy.
+        snapshot = rows[INPUT_COLUMNS].copy() if isinstance(rows, pd.DataFrame) else list(rows)
+        self.shadow_scorer.submit(shadow, current.version, snapshot, np.asarray(predictions, dtype=np.float64))
+
+    def predict(self, user_input: dict) -> float:
+        current, shadow = self.current, self.shadow
+        price = current.predict(user_input)
+        self._shadow(current, shadow, [user_input], [price])
+        return price
+
+    def predict_with_interval(self, user_input: dict) -> tuple:
+        current, shadow = self.current, self.shadow
+        result = current.predict_with_interval(user_input)
+        self._shadow(current, shadow, [user_input], [result[0]])
+        return result
+
+    def predict_many(self, rows, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+        current, shadow = self.current, self.shadow
+        predictions = current.predict_many(rows, chunk_size)
+        self._shadow(current, shadow, rows, predictions)
+        return predictions
+
+    def predict_many_with_intervals(self, rows, chunk_size: int = CHUNK_SIZE) -> tuple:
+        current, shadow = self.current, self.shadow
+        result = current.predict_many_with_intervals(rows, chunk_size)
+        self._shadow(current, shadow, rows, result[0])
+        return result
+
+
+def open_predictor(path, grid_path: str = None, **kwargs):
+    if is_registry(path):
+        return LivePredictor(path, grid_path=grid_path, **kwargs)
+    return Predictor(str(path), grid_path=grid_path)
+
+
+def summarize_shadow(path: Path, last: int = None) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    if last:
+        records = records[-last:]
+    summary = {}
+    for record in records:
+        key = (record["active"], record["shadow"])
+        stats = summary.setdefault(key, {"calls": 0, "rows": 0, "abs_pct_sum": 0.0, "max_abs_pct": 0.0})
+        stats["calls"] += record.get("calls", 1)
+        stats["rows"] += record["rows"]
+        stats["abs_pct_sum"] += record["mean_abs_pct"] * record["rows"]
+        stats["max_abs_pct"] = max(stats["max_abs_pct"], record["max_abs_pct"])
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry.")
+    parser.add_argument("--registry", default=str(REGISTRY_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list published versions and the active/shadow pointers")
+    publish = commands.add_parser("publish", help="copy a bundle into the registry")
+    publish.add_argument("bundle")
+    target = publish.add_mutually_exclusive_group()
+    target.add_argument("--activate", action="store_true", help="serve it immediately")
+    target.add_argument("--shadow", action="store_true", help="score live traffic with it in the background")
+    activate = commands.add_parser("activate", help="switch serving to a published version")
+    activate.add_argument("version")
+    shadow = commands.add_parser("shadow", help="set or clear (no version) the shadow model")
+    shadow.add_argument("version", nargs="?")
+    deltas = commands.add_parser("deltas", help="summarize logged shadow prediction deltas")
+    deltas.add_argument("--last", type=int, help="only the last N logged scoring passes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    registry = ModelRegistry(args.registry)
+    if args.command == "publish":
+        version = registry.publish(args.bundle, args.activate, args.shadow)
+        print(f"Published {version} to {registry.path}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+    elif args.command == "shadow":
+        registry.set_shadow(args.version)
+    elif args.command == "deltas":
+        summary = summarize_shadow(registry.path / SHADOW_LOG, args.last)
+        if not summary:
+            print("No shadow deltas logged")
+        for (active, shadow), stats in summary.items():
+            print(f"{active} -> {shadow}: {stats['rows']} rows from {stats['calls']} calls, "
+                  f"mean |delta| {stats['abs_pct_sum'] / stats['rows']:.2%}, max {stats['max_abs_pct']:.2%}")
+
+    if args.command in ("list", "activate", "shadow", "publish"):
+        pointers = registry.pointers()
+        for version in registry.versions():
+            marker = " (active)" if version == pointers["active"] else " (shadow)" if version == pointers["shadow"] else ""
+            print(f"{version}{marker}")
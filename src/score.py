@@ -0,0 +1,198 @@
+import os
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+from pathlib import Path
+from predict import Predictor
+from comparables import K, ComparablesIndex
+from registry import resolve_model_path
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+CHUNK_SIZE = 50000
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+_predictor = None
+_comparables = None
+
+
+def detect_format(path: Path) -> str:
+    try:
+        return FORMATS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported file type {path.suffix!r}, expected one of {sorted(FORMATS)}")
+
+
+def read_chunks(path: Path, chunk_size: int):
+    fmt = detect_format(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif fmt == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+def write_frame(df: pd.DataFrame, path: Path):
+    fmt = detect_format(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if fmt == "csv":
+        df.to_csv(tmp_path, index=False)
+    elif fmt == "jsonl":
+        df.to_json(tmp_path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def merge_parts(parts: list, output: Path):
+    fmt = detect_format(output)
+    tmp_path = output.with_name(f".{output.name}.tmp")
+
+    if fmt == "parquet":
+        writer = None
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:
+            pq.write_table(pa.table({}), tmp_path)
+        else:
+            writer.close()
+    else:
+        with open(tmp_path, "wb") as out:
+            for i, part in enumerate(parts):
+                with open(part, "rb") as file:
+                    if fmt == "csv" and i > 0:
+                        file.readline()
+                    shutil.copyfileobj(file, out)
+
+    os.replace(tmp_path, output)
+
+
+def add_comparables(index: ComparablesIndex, df: pd.DataFrame, k: int) -> pd.DataFrame:
+    # Median price of the k comparables and their median distance in the index's metres.
+    columns = ["latitude", "longitude", "area", "rooms", "floor", "category"]
+    values = df[columns].to_numpy(dtype=np.float64)
+    valid = np.isfinite(values).all(axis=1) & (values[:, 2] > 0)
+    price = np.full(len(df), np.nan)
+    match = np.full(len(df), np.nan)
+    if valid.any():
+        dist, idx = index.query_many(df[valid], k)
+        price[valid] = np.median(index.columns["price"][idx].astype(np.float64), axis=1)
+        match[valid] = np.median(dist, axis=1)
+    df["comparables_price"] = price.round()
+    df["comparables_match_m"] = match.round()
+    return df
+
+
+def score_frame(predictor: Predictor, df: pd.DataFrame, comparables: ComparablesIndex = None,
+                k: int = K) -> pd.DataFrame:
+    # Chunks are read for scoring only, so the prediction columns are added in place.
+    predicted, lower, upper = predictor.predict_many_with_intervals(df)
+    scored = df
+    scored["predicted_price"] = predicted.round()
+    scored["lower_bound"] = lower.round()
+    scored["upper_bound"] = upper.round()
+    if comparables is not None:
+        add_comparables(comparables, scored, k)
+    return scored
+
+
+def _init_worker(model_path: str, comparables_path: str = None):
+    global _predictor, _comparables
+    _predictor = Predictor(str(resolve_model_path(model_path)))
+    _comparables = ComparablesIndex(comparables_path) if comparables_path else None
+
+
+def _score_chunk(df: pd.DataFrame, part_path: Path, k: int = K) -> int:
+    write_frame(score_frame(_predictor, df, _comparables, k), part_path)
+    return len(df)
+
+
+class BulkScorer:
+    def __init__(self, model_path: str, chunk_size: int = CHUNK_SIZE, workers: int = 1,
+                 comparables_path: str = None, k: int = K):
+        self.model_path = model_path
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.comparables_path = comparables_path
+        self.k = k
+
+    def _pending_chunks(self, input_path: Path, parts_dir: Path, suffix: str):
+        for i, chunk in enumerate(read_chunks(input_path, self.chunk_size)):
+            part_path = parts_dir / f"part-{i:06d}{suffix}"
+            if part_path.exists():
+                continue
+            yield chunk, part_path
+
+    def _run_inline(self, chunks, progress):
+        _init_worker(self.model_path, self.comparables_path)
+        for chunk, part_path in chunks:
+            progress.update(_score_chunk(chunk, part_path, self.k))
+
+    def _run_parallel(self, chunks, progress):
+        max_in_flight = self.workers * 2
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.model_path, self.comparables_path)) as pool:
+            in_flight = set()
+            for chunk, part_path in chunks:
+                in_flight.add(pool.submit(_score_chunk, chunk, part_path, self.k))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        progress.update(future.result())
+            for future in in_flight:
+                progress.update(future.result())
+
+    def score(self, input_path, output_path):
+        input_path, output_path = Path(input_path), Path(output_path)
+        detect_format(input_path)
+        suffix = output_path.suffix.lower()
+        detect_format(output_path)
+
+        parts_dir = output_path.with_name(f"{output_path.name}.parts")
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        resumed = len(list(parts_dir.glob(f"part-*{suffix}")))
+        if resumed:
+            print(f"Resuming: {resumed} chunks already scored in {parts_dir}")
+
+        chunks = self._pending_chunks(input_path, parts_dir, suffix)
+        start = time.perf_counter()
+        with tqdm(desc="Scoring", unit="rows") as progress:
+            if self.workers > 1:
+                self._run_parallel(chunks, progress)
+            else:
+                self._run_inline(chunks, progress)
+            scored_rows = progress.n
+        elapsed = time.perf_counter() - start
+
+        merge_parts(sorted(parts_dir.glob(f"part-*{suffix}")), output_path)
+        shutil.rmtree(parts_dir)
+
+        rate = scored_rows / elapsed if elapsed else 0.0
+        print(f"Scored {scored_rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec) -> {output_path}")
+        return output_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet/JSONL file of cleaned listings in chunks.")
+    parser.add_argument("input", help="listings in the shape DatasetCleaner produces")
+    parser.add_argument("output", help="destination file; format follows the extension")
+    parser.add_argument("--model", default="./models/bundle")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--comparables", help="comparables index to add the median price of similar listings from")
+    parser.add_argument("-k", type=int, default=K, help="comparables per listing")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    BulkScorer(args.model, args.chunk_size, args.workers, args.comparables, args.k).score(args.input, args.output)
@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+SAMPLE_INTERVAL = 0.005
+MB = 2 ** 20
+
+
+def current_rss() -> int:
+    # /proc/self/statm is Linux-only; elsewhere fall back to the process high-water mark.
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakSampler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class StageTracker:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start_rss = current_rss()
+        start = time.perf_counter()
+        with PeakSampler(self.interval) as sampler:
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+        self.stages.append({
+            "stage": name, "seconds": elapsed, "start_mb": start_rss / MB,
+            "peak_mb": sampler.peak / MB, "end_mb": current_rss() / MB,
+        })
+
+    def summary(self) -> list:
+        return list(self.stages)
+
+    def report(self, title: str = "Stages"):
+        width = max([len(stage["stage"]) for stage in self.stages] + [5])
+        print(f"{title}: time and resident memory per stage")
+        print(f"{'stage':<{width}} {'seconds':>9} {'start MB':>9} {'peak MB':>9} {'end MB':>9}")
+        for stage in self.stages:
+            print(f"{stage['stage']:<{width}} {stage['seconds']:>9.2f} {stage['start_mb']:>9.1f} "
+                  f"{stage['peak_mb']:>9.1f} {stage['end_mb']:>9.1f}")
+        total = sum(stage["seconds"] for stage in self.stages)
+        peak = max((stage["peak_mb"] for stage in self.stages), default=0.0)
+        print(f"{'total':<{width}} {total:>9.2f} {'':>9} {peak:>9.1f}")
@@ -0,0 +1,79 @@
+import os
+import pandas as pd
+import pyarrow.feather as feather
+from pathlib import Path
+
+COLUMNAR_SUFFIXES = (".parquet", ".feather")
+EXCEL_SUFFIXES = (".xlsx",)
+SEARCH_ORDER = (".parquet", ".feather", ".xlsx")
+
+
+def write_frame(df: pd.DataFrame, path, dtypes: dict = None) -> Path:
+    path = Path(path)
+    if dtypes:
+        df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp_path, index=False)
+    elif path.suffix == ".feather":
+        # Uncompressed Arrow IPC can be memory-mapped on reload without copying.
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+    elif path.suffix in EXCEL_SUFFIXES:
+        df.to_excel(tmp_path, index=False, engine="openpyxl")
+    else:
+        raise ValueError(f"Unsupported file type {path.suffix!r}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_frame(path, memory_map: bool = False, columns: list = None) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=memory_map)
+    if path.suffix == ".feather":
+        return feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    if path.suffix in EXCEL_SUFFIXES:
+        return pd.read_excel(path, usecols=columns)
+    raise ValueError(f"Unsupported file type {path.suffix!r}")
+
+
+def resolve(folder, name: str) -> Path:
+    folder = Path(folder)
+    if Path(name).suffix:
+        return folder / name
+    for suffix in SEARCH_ORDER:
+        path = folder / f"{name}{suffix}"
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"No {name}{{{','.join(SEARCH_ORDER)}}} in {folder}")
+
+
+def find_split(folder, split: str) -> Path:
+    # Feature splits written by train.py first, then the cleaned file of the same name.
+    for name in (f"{split}_features", split):
+        try:
+            return resolve(folder, name)
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"No {split} split in {folder}")
+
+
+def find_splits(folder, splits) -> list:
+    paths = []
+    for split in splits:
+        try:
+            paths.append(find_split(folder, split))
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+def import_excel(path, dtypes: dict = None) -> Path:
+    path = Path(path)
+    return write_frame(pd.read_excel(path), path.with_suffix(".parquet"), dtypes)
+
+
+def export_excel(path, destination=None) -> Path:
+    path = Path(path)
+    return write_frame(read_frame(path), destination or path.with_suffix(".xlsx"))
@@ -0,0 +1,69 @@
+import json
+import random
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+SIZES = {"1k": 1000, "100k": 100000, "1M": 1000000}
+ADDRESSES = ["Nəsimi r.", "Yasamal r.", "Xətai r.", "Nərimanov r.", "Binəqədi r.", "Səbail r.",
+             "28 May m.", "Gənclik m.", "Elmlər Akademiyası m.", "Nizami m.", "Xalqlar Dostluğu m."]
+LATITUDE_RANGE = (40.33, 40.5)
+LONGITUDE_RANGE = (49.75, 50.0)
+
+
+def parse_size(label: str) -> int:
+    if label in SIZES:
+        return SIZES[label]
+    return int(label)
+
+
+def listings(rows: int, seed: int = 0) -> pd.DataFrame:
+    # Cleaned listings in the shape DatasetCleaner produces.
+    rng = np.random.default_rng(seed)
+    rooms = rng.integers(1, 6, rows)
+    area = rooms * rng.integers(25, 61, rows)
+    max_floor = rng.integers(2, 26, rows)
+    floor = rng.integers(1, max_floor + 1)
+    price = (area * rng.uniform(1200, 3000, rows) / 500).round() * 500
+    return pd.DataFrame({
+        "listing_id": (3000000 + np.arange(rows)).astype(str),
+        "address": pd.Categorical.from_codes(rng.integers(0, len(ADDRESSES), rows),
+                                             categories=[address.lower() for address in ADDRESSES]),
+        "latitude": rng.uniform(*LATITUDE_RANGE, rows),
+        "longitude": rng.uniform(*LONGITUDE_RANGE, rows),
+        "area": area.astype("int32"), "rooms": rooms.astype("int16"),
+        "floor": floor.astype("int16"), "max_floor": max_floor.astype("int16"),
+        "category": rng.integers(0, 2, rows).astype("int8"), "repaired": rng.integers(0, 2, rows).astype("int8"),
+        "receipt": rng.integers(0, 2, rows).astype("int8"), "mortgage": rng.integers(0, 2, rows).astype("int8"),
+        "price": price.astype("int32"),
+    })
+
+
+def write_scrape(path, rows: int, seed: int = 0) -> Path:
+    # Records shaped like scrape/scraperpw.py output, with the odd incomplete or duplicate listing.
+    rng = random.Random(seed)
+    path = Path(path)
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(rows):
+            item_id = 3000000 + (i if rng.random() > 0.01 else rng.randrange(i + 1))
+            max_floor = rng.randint(2, 25)
+            rooms = rng.randint(1, 5)
+            record = {
+                "url": f"https://bina.az/items/{item_id}",
+                "price": f"{rng.randint(40, 900)}\xa0{rng.choice(['000', '500'])}",
+                "address": rng.choice(ADDRESSES),
+                "latitude": f"{rng.uniform(*LATITUDE_RANGE):.7f}",
+                "longitude": f"{rng.uniform(*LONGITUDE_RANGE):.7f}",
+                "kateqoriya": rng.choice(["yeni tikili", "köhnə tikili"]),
+                "mərtəbə": f"{rng.randint(1, max_floor)} / {max_floor}",
+                "sahə": f"{rng.randint(25, 60) * rooms} m²",
+                "otaq sayı": str(rooms),
+                "çıxarış": rng.choice(["var", "yoxdur"]),
+                "təmir": rng.choice(["var", "yoxdur"]),
+            }
+            if rng.random() < 0.3:
+                record["i̇poteka"] = "var"
+            if rng.random() < 0.005:
+                del record["sahə"]
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
@@ -1,71 +1,181 @@
-import pickle
+import time
+import argparse
 import warnings
 import numpy as np
 import pandas as pd
+from pathlib import Path
+import intervals
+import comparables
+from stages import StageTracker
 from catboost import CatBoostRegressor
-from preprocessing import Preprocessor
+from storage import read_frame, resolve, write_frame
+from preprocessing import FEATURE_DTYPES, Preprocessor
+from bundle import CAT_FEATURES, TRANSFORMS, is_bundle, load_bundle, save_bundle
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 
 warnings.filterwarnings('ignore')
 
-print("Processing...")
-try:
-    train = pd.read_excel("./data/train.xlsx") 
-    test = pd.read_excel("./data/test.xlsx")
-    oot = pd.read_excel("./data/oot.xlsx")
+DATA_DIR = Path("./data")
+BUNDLE_PATH = "./models/bundle"
+SPLITS = ("train", "test", "oot")
+
+def split_path(name: str) -> Path:
+    return DATA_DIR / f"{name}_features.parquet"
+
+def has_raw_data() -> bool:
+    try:
+        resolve(DATA_DIR, "data")
+        return True
+    except FileNotFoundError:
+        return False
+
+def apply_transforms(df: pd.DataFrame):
+    # One pass per column, computed in float64 and stored back at the compact feature dtype.
+    for col in TRANSFORMS['log']:
+        df[col] = np.log(df[col].to_numpy(dtype=np.float64)).astype(FEATURE_DTYPES[col], copy=False)
+    for col, power in TRANSFORMS['power'].items():
+        df[col] = np.power(df[col].to_numpy(dtype=np.float64), power).astype(FEATURE_DTYPES[col], copy=False)
+
+class TimeBudget:
+    # CatBoost callback: stop boosting once the wall-clock budget for fit() is spent.
+    # The clock starts when the callback is created, so pool building and quantization count too.
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.stopped_at = None
+
+    def after_iteration(self, info) -> bool:
+        if time.monotonic() < self.deadline:
+            return True
+        self.stopped_at = info.iteration
+        return False
+
+def mape_of(model, X, y_log) -> float:
+    return mean_absolute_percentage_error(np.exp(y_log), np.exp(model.predict(X)))
+
+def evaluate_baseline(path, splits: dict) -> dict:
+    # Score the currently shipped model on this run's splits before it gets overwritten.
+    if not is_bundle(path):
+        return {}
+    bundle = load_bundle(path)
+    try:
+        return {name: mape_of(bundle.model, X[bundle.feature_order], y) for name, (X, y) in splits.items()}
+    except KeyError as e:
+        print(f"Baseline {bundle.version} uses other features ({e}), skipping comparison")
+        return {}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the price model and save it as a bundle.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--learning-rate", type=float, default=0.0168)
+    parser.add_argument("--early-stopping-rounds", type=int, default=0,
+                        help="stop when the test split has not improved for this many rounds (0 = off)")
+    parser.add_argument("--validation-size", type=float, default=0.1,
+                        help="fraction of train held out to pick the best iteration when stopping early")
+    parser.add_argument("--time-budget", type=float, default=0,
+                        help="wall-clock seconds allowed for fitting (0 = unlimited)")
+    parser.add_argument("--threads", type=int, default=-1, help="CatBoost thread_count (-1 = all cores)")
+    parser.add_argument("--border-count", type=int, help="histogram borders per numeric feature (CatBoost default 254)")
+    parser.add_argument("--boosting-type", choices=["Plain", "Ordered"], help="CatBoost boosting_type")
+    parser.add_argument("--interval-coverage", type=float, default=intervals.COVERAGE,
+                        help="target coverage of the conformal price intervals stored in the bundle")
+    parser.add_argument("--output", default=BUNDLE_PATH)
+    parser.add_argument("--comparables", default=str(comparables.INDEX_PATH),
+                        help="where to build the comparable listings index ('' to skip)")
+    return parser.parse_args()
+
+args = parse_args()
+tracker = StageTracker()
 
-except:
-    processor = Preprocessor()
-    data = processor.process("data.xlsx")
-    oot = processor.process("oot.xlsx")
+print("Processing...")
+if not has_raw_data() and all(split_path(name).exists() for name in SPLITS):
+    with tracker.stage("load"):
+        train, test, oot = (read_frame(split_path(name), memory_map=True) for name in SPLITS)
 
-    low, high = data["price"].quantile([0.02, 0.98])
-    data = data[(data["price"] >= low) & (data["price"] <= high)]
-    oot = oot[(oot["price"] >= low) & (oot["price"] <= high)]
+elif not has_raw_data() and all((DATA_DIR / f"{name}.xlsx").exists() for name in SPLITS):
+    with tracker.stage("load"):
+        for name in SPLITS:
+            write_frame(read_frame(DATA_DIR / f"{name}.xlsx"), split_path(name), FEATURE_DTYPES)
+        train, test, oot = (read_frame(split_path(name), memory_map=True) for name in SPLITS)
 
-    train, test = train_test_split(data, test_size=0.15, random_state=42)
-    print(f"Train: {len(train)}, Test: {len(test)}, OOT: {len(oot)}")
+else:
+    # Preprocessor.process reuses cached features, so re-splitting from raw data is cheap
+    # and picks up any change to the raw files, stations or feature code.
+    processor = Preprocessor()
+    with tracker.stage("feature engineering"):
+        data = processor.process("data")
+        oot = processor.process("oot")
 
-    for col in ['price', 'area']:
-        train[col] = np.log(train[col])
-        test[col] = np.log(test[col])
-        oot[col] = np.log(oot[col])
+    with tracker.stage("split"):
+        low, high = data["price"].quantile([0.02, 0.98])
+        data = data[(data["price"] >= low) & (data["price"] <= high)]
+        oot = oot[(oot["price"] >= low) & (oot["price"] <= high)]
 
-    train['distance_from_center'] = train['distance_from_center'] ** 0.25
-    test['distance_from_center'] = test['distance_from_center'] ** 0.25
-    oot['distance_from_center'] = oot['distance_from_center'] ** 0.25
+        # Transforms are row-wise, so applying them before the split gives the same splits.
+        apply_transforms(data)
+        apply_transforms(oot)
 
-    train['distance_to_nearest_metro'] = train['distance_to_nearest_metro'] ** 0.25
-    test['distance_to_nearest_metro'] = test['distance_to_nearest_metro'] ** 0.25
-    oot['distance_to_nearest_metro'] = oot['distance_to_nearest_metro'] ** 0.25
+        train, test = train_test_split(data, test_size=0.15, random_state=42)
+        del data
+        print(f"Train: {len(train)}, Test: {len(test)}, OOT: {len(oot)}")
 
-    train.to_excel('./data/train.xlsx', index=False)
-    test.to_excel('./data/test.xlsx', index=False)
-    oot.to_excel('./data/oot.xlsx', index=False)
+    with tracker.stage("write splits"):
+        for name, df in zip(SPLITS, (train, test, oot)):
+            write_frame(df, split_path(name), FEATURE_DTYPES)
 
 print("Training...")
-X_train = train.drop(columns=["price"])
-y_train = train["price"]
-X_test = test.drop(columns=["price"])
-y_test = test["price"]
-X_oot = oot.drop(columns=["price"])
-y_oot = oot["price"]
+# Splits are owned here, so the target is popped instead of copying every frame without it.
+X_train, X_test, X_oot = train, test, oot
+y_train = X_train.pop("price")
+y_test = X_test.pop("price")
+y_oot = X_oot.pop("price")
+
+params = {"learning_rate": args.learning_rate, "iterations": args.iterations, "thread_count": args.threads}
+if args.border_count:
+    params["border_count"] = args.border_count
+if args.boosting_type:
+    params["boosting_type"] = args.boosting_type
 
 model = CatBoostRegressor(
-    learning_rate = 0.0168,
-    iterations = 2000,
+    **params,
     verbose=0
     )
 
-model.fit(X_train, y_train,
-          cat_features=[X_train.columns.get_loc('address'),
-          X_train.columns.get_loc('nearest_metro')])
+fit_options = {}
+X_fit, y_fit = X_train, y_train
+if args.early_stopping_rounds > 0 or args.time_budget > 0:
+    # With an eval set the model is cut back to its best iteration. It comes out of train, so
+    # the test split stays unseen for the metrics, the baseline and the interval check below.
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=args.validation_size,
+                                                      random_state=42)
+    fit_options.update(eval_set=(X_valid, y_valid), use_best_model=True)
+if args.early_stopping_rounds > 0:
+    fit_options["early_stopping_rounds"] = args.early_stopping_rounds
+
+with tracker.stage("fit"):
+    budget = TimeBudget(args.time_budget) if args.time_budget > 0 else None
+    if budget:
+        fit_options["callbacks"] = [budget]
+    model.fit(X_fit, y_fit,
+              cat_features=[X_fit.columns.get_loc(col) for col in CAT_FEATURES],
+              **fit_options)
+fit_seconds = tracker.stages[-1]["seconds"]
+trees = model.tree_count_
+if budget and budget.stopped_at is not None:
+    print(f"Time budget of {args.time_budget:.0f}s reached after {budget.stopped_at + 1} iterations")
+elif trees < args.iterations:
+    print(f"Early stopping kept {trees} of {args.iterations} iterations")
 
 print("Evaluating...")
-y_train_pred_log = model.predict(X_train)
-y_test_pred_log = model.predict(X_test)
-y_oot_pred_log = model.predict(X_oot)
+with tracker.stage("evaluate"):
+    y_train_pred_log = model.predict(X_train)
+    y_test_pred_log = model.predict(X_test)
+    y_oot_pred_log = model.predict(X_oot)
+    baseline = evaluate_baseline(args.output, {"test": (X_test, y_test), "oot": (X_oot, y_oot)})
+    # Intervals are calibrated on OOT residuals and checked on the test split.
+    interval_spec = intervals.fit(y_oot, y_oot_pred_log, args.interval_coverage)
+    interval_check = intervals.evaluate(interval_spec, y_test, y_test_pred_log)
 
 y_train_pred = np.exp(y_train_pred_log)
 y_test_pred = np.exp(y_test_pred_log)
@@ -102,5 +212,27 @@ if test_oot_difference <= 0.2:
 else:
     print(f"⚠️ Overfit for test and oot! Gap is {round(test_oot_difference, 4)}")
 
-with open("./models/model.pkl", "wb") as f:
-    pickle.dump(model, f)
\ No newline at end of file
+print(f"{args.interval_coverage:.0%} price intervals: test coverage {interval_check['coverage']:.2%}, "
+      f"median width {interval_check['median_relative_width']:.1%} of the price")
+
+if baseline:
+    print("MAPE against the shipped model:")
+    for name, new in (("test", mape_test), ("oot", mape_oot)):
+        print(f"  {name:<5} baseline {baseline[name]:.4%} | new {new:.4%} | change {(new - baseline[name]) * 100:+.4f}")
+
+metrics = {"mae_train": mae_train, "mape_train": mape_train, "mae_test": mae_test,
+           "mape_test": mape_test, "mae_oot": mae_oot, "mape_oot": mape_oot,
+           "iterations": int(trees), "fit_seconds": fit_seconds,
+           "interval_coverage_test": interval_check["coverage"],
+           "interval_width_test": interval_check["median_relative_width"]}
+with tracker.stage("save"):
+    bundle_path = save_bundle(model, args.output, metrics=metrics, intervals=interval_spec)
+print(f"Model bundle saved to {bundle_path}")
+
+if args.comparables:
+    with tracker.stage("comparables"):
+        listings = pd.concat([comparables.from_features(X, y) for X, y in
+                              ((X_train, y_train), (X_test, y_test), (X_oot, y_oot))], ignore_index=True)
+        index = comparables.build(listings, args.comparables)
+    print(f"Comparables index of {len(index)} listings saved to {args.comparables}")
+tracker.report("Training")
\ No newline at end of file
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from catboost import CatBoostRegressor, Pool
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
+from bundle import CAT_FEATURES
+from storage import read_frame
+
+DATA_DIR = Path("./data")
+RESULTS_PATH = Path("models") / "tuning.db"
+BASE_PARAMS = {"learning_rate": 0.0168, "iterations": 2000}
+SEARCH_SPACE = {
+    "learning_rate": [0.0168, 0.03, 0.05, 0.1],
+    "depth": [4, 6, 8],
+    "l2_leaf_reg": [1, 3, 10],
+    "border_count": [64, 128, 254],
+}
+EARLY_STOPPING_ROUNDS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    run_id TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    cv TEXT NOT NULL,
+    params TEXT NOT NULL,
+    mae REAL NOT NULL,
+    mape REAL NOT NULL,
+    mape_std REAL NOT NULL,
+    best_iteration INTEGER NOT NULL,
+    fit_seconds REAL NOT NULL,
+    thread_count INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, trial)
+);
+"""
+
+_folds = None
+
+
+def split_path(name: str) -> Path:
+    return DATA_DIR / f"{name}_features.parquet"
+
+
+def load_split(name: str):
+    df = read_frame(split_path(name))
+    target = df.pop("price")
+    return df, target
+
+
+def build_folds(cv: str, n_folds: int, seed: int) -> list:
+    # Pools are built once per process and sliced per fold, so trials only pay for fitting.
+    train, y_train = load_split("train")
+    test, y_test = load_split("test")
+    cat_features = [train.columns.get_loc(col) for col in CAT_FEATURES]
+    eval_pool = Pool(test, y_test, cat_features=cat_features)
+
+    if cv == "time":
+        oot, y_oot = load_split("oot")
+        return [(Pool(train, y_train, cat_features=cat_features), eval_pool,
+                 Pool(oot, cat_features=cat_features), y_oot.to_numpy())]
+
+    full_pool = Pool(train, y_train, cat_features=cat_features)
+    target = y_train.to_numpy()
+    folds = []
+    for fit_idx, holdout_idx in KFold(n_folds, shuffle=True, random_state=seed).split(train):
+        folds.append((full_pool.slice(fit_idx), eval_pool, full_pool.slice(holdout_idx), target[holdout_idx]))
+    return folds
+
+
+def _init_worker(cv: str, n_folds: int, seed: int):
+    global _folds
+    _folds = build_folds(cv, n_folds, seed)
+
+
+def run_trial(params: dict, thread_count: int) -> dict:
+    maes, mapes, iterations = [], [], []
+    start = time.perf_counter()
+    for fit_pool, eval_pool, holdout_pool, holdout_target in _folds:
+        model = CatBoostRegressor(**{**BASE_PARAMS, **params}, thread_count=thread_count,
+                                  verbose=0, allow_writing_files=False)
+        model.fit(fit_pool, eval_set=eval_pool, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+
+        y_pred = np.exp(model.predict(holdout_pool))
+        y_true = np.exp(holdout_target)
+        maes.append(mean_absolute_error(y_true, y_pred))
+        mapes.append(mean_absolute_percentage_error(y_true, y_pred))
+        iterations.append(model.get_best_iteration())
+
+    return {
+        "params": params, "mae": float(np.mean(maes)), "mape": float(np.mean(mapes)),
+        "mape_std": float(np.std(mapes)), "best_iteration": int(np.mean(iterations)),
+        "fit_seconds": (time.perf_counter() - start) / len(_folds), "thread_count": thread_count,
+    }
+
+
+def sample_params(space: dict, trials: int, seed: int) -> list:
+    grid = ParameterGrid(space)
+    if trials >= len(grid):
+        return list(grid)
+    return list(ParameterSampler(space, trials, random_state=seed))
+
+
+class TrialStore:
+    def __init__(self, path=RESULTS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, run_id: str, trial: int, cv: str, result: dict):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, trial, cv, json.dumps(result["params"], sort_keys=True), result["mae"], result["mape"],
+                 result["mape_std"], result["best_iteration"], result["fit_seconds"], result["thread_count"],
+                 datetime.now().isoformat(timespec="seconds")))
+
+    def last_run(self):
+        row = self.connection.execute("SELECT run_id FROM trials ORDER BY created_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def results(self, run_id: str = None) -> pd.DataFrame:
+        query, params = "SELECT * FROM trials", []
+        if run_id:
+            query += " WHERE run_id = ?"
+            params.append(run_id)
+        return pd.read_sql_query(query + " ORDER BY mape", self.connection, params=params)
+
+
+class Tuner:
+    def __init__(self, cv: str = "kfold", n_folds: int = 5, workers: int = 1, seed: int = 42):
+        self.cv = cv
+        self.n_folds = n_folds
+        self.workers = workers
+        self.seed = seed
+        # Split the cores between worker processes instead of letting every trial use all of them.
+        self.thread_count = max(1, (os.cpu_count() or 1) // workers)
+
+    def run(self, space: dict, trials: int, store: TrialStore) -> str:
+        candidates = sample_params(space, trials, self.seed)
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        folds = 1 if self.cv == "time" else self.n_folds
+        print(f"Run {run_id}: {len(candidates)} trials, {self.cv} CV with {folds} folds, "
+              f"{self.workers} workers x {self.thread_count} threads")
+
+        if self.workers > 1:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(self.cv, self.n_folds, self.seed)) as pool:
+                futures = {pool.submit(run_trial, params, self.thread_count): i for i, params in enumerate(candidates)}
+                for future in as_completed(futures):
+                    self._record(store, run_id, futures[future], future.result())
+        else:
+            _init_worker(self.cv, self.n_folds, self.seed)
+            for i, params in enumerate(candidates):
+                self._record(store, run_id, i, run_trial(params, self.thread_count))
+        return run_id
+
+    def _record(self, store: TrialStore, run_id: str, trial: int, result: dict):
+        store.add(run_id, trial, self.cv, result)
+        print(f"Trial {trial}: MAPE {result['mape']:.4%} MAE {result['mae']:.0f} "
+              f"best_iteration {result['best_iteration']} fit {result['fit_seconds']:.1f}s {result['params']}")
+
+
+def show(results: pd.DataFrame, limit: int, tolerance: float):
+    if results.empty:
+        print("No trials recorded")
+        return
+    print(results.head(limit)[["trial", "mape", "mape_std", "mae", "best_iteration", "fit_seconds", "params"]]
+          .to_string(index=False))
+
+    # Fastest trial whose MAPE is within the tolerance of the best one.
+    best = results["mape"].min()
+    close = results[results["mape"] <= best + tolerance]
+    fastest = close.loc[close["fit_seconds"].idxmin()]
+    print(f"\nBest MAPE {best:.4%}. Fastest within {tolerance:.2%}: trial {fastest['trial']} "
+          f"with MAPE {fastest['mape']:.4%} in {fastest['fit_seconds']:.1f}s: {fastest['params']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search over the training splits.")
+    parser.add_argument("--store", default=str(RESULTS_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run a search and record every trial")
+    run.add_argument("--cv", choices=["kfold", "time"], default="kfold",
+                     help="kfold over the train split, or fit on train and score on the later oot split")
+    run.add_argument("--folds", type=int, default=5)
+    run.add_argument("--trials", type=int, default=20, help="random trials; the full grid if it is smaller")
+    run.add_argument("--space", help="JSON file mapping CatBoost parameters to lists of values")
+    run.add_argument("--workers", type=int, default=1, help="parallel trials; cores are split between them")
+    run.add_argument("--seed", type=int, default=42)
+
+    show_parser = commands.add_parser("show", help="list trials of a run, best first")
+    show_parser.add_argument("--run", help="run id (default: the latest run)")
+    for command in (run, show_parser):
+        command.add_argument("--limit", type=int, default=10, help="trials to list")
+        command.add_argument("--tolerance", type=float, default=0.002,
+                             help="MAPE slack when picking the fastest near-best trial")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with TrialStore(args.store) as store:
+        if args.command == "run":
+            space = SEARCH_SPACE
+            if args.space:
+                with open(args.space, "r", encoding="utf-8") as file:
+                    space = json.load(file)
+            tuner = Tuner(args.cv, args.folds, args.workers, args.seed)
+            run_id = tuner.run(space, args.trials, store)
+            show(store.results(run_id), args.limit, args.tolerance)
+        else:
+            show(store.results(args.run or store.last_run()), args.limit, args.tolerance)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules in src/ import each other flatly, as when the scripts run from the repo root.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,68 @@
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import comparables
+
+
+def make_listings(rows: int, seed: int = 0, prefix: str = "id") -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "listing_id": [f"{prefix}{i}" for i in range(rows)],
+        "address": "yasamal r.",
+        "latitude": rng.uniform(40.35, 40.45, rows),
+        "longitude": rng.uniform(49.75, 49.95, rows),
+        "area": rng.integers(30, 150, rows).astype(float),
+        "rooms": rng.integers(1, 5, rows),
+        "floor": rng.integers(1, 17, rows),
+        "max_floor": 17,
+        "category": rng.integers(0, 2, rows),
+        "repaired": rng.integers(0, 2, rows),
+        "price": rng.integers(50000, 400000, rows).astype(float),
+    })
+
+
+def brute_force(index: comparables.ComparablesIndex, queries: pd.DataFrame, k: int) -> np.ndarray:
+    live = pd.concat([index.base[~index.removed], index.delta], ignore_index=True)
+    points = comparables.project(queries)
+    candidates = comparables.project(live)
+    dist = np.sqrt(((points[:, None, :] - candidates[None, :, :]) ** 2).sum(axis=2))
+    return np.sort(dist, axis=1)[:, :k]
+
+
+def test_replaced_rows_are_skipped_without_blowing_up_queries(tmp_path):
+    index = comparables.build(make_listings(18000), tmp_path / "index")
+    replacements = make_listings(4500, seed=1)
+    index.insert(replacements, compact_at=10 ** 9, max_removed=10 ** 9)
+    assert index.removed.sum() == 4500
+    assert len(index) == 18000
+
+    queries = make_listings(5000, seed=2)
+    index.query_many(queries.iloc[:10])
+    tracemalloc.start()
+    start = time.perf_counter()
+    dist, idx = index.query_many(queries)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert elapsed < 1.0
+    assert peak < 20 * 2 ** 20
+    assert not index.removed[idx[idx < len(index.base)]].any()
+    np.testing.assert_allclose(dist[:500], brute_force(index, queries.iloc[:500], comparables.K))
+
+
+def test_insert_replaces_by_id_and_compacts_past_removed_threshold(tmp_path):
+    index = comparables.build(make_listings(3000), tmp_path / "index")
+    updated = make_listings(50).assign(price=1.0)
+    index.insert(updated, max_removed=100)
+    assert len(index) == 3000 and index.removed.sum() == 50 and len(index.delta) == 50
+
+    index.insert(make_listings(200, seed=3).assign(listing_id=[f"id{i}" for i in range(100, 300)]),
+                 max_removed=100)
+    assert len(index.delta) == 0 and not index.removed.any()
+    assert len(index) == 3000
+
+    reloaded = comparables.ComparablesIndex(tmp_path / "index")
+    assert len(reloaded) == 3000
+    assert (reloaded.listings.set_index("listing_id").loc[[f"id{i}" for i in range(50)], "price"] == 1).all()
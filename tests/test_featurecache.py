@@ -0,0 +1,34 @@
+import pandas as pd
+import synthetic
+from featurecache import FeatureCache
+
+
+def compute_features(df: pd.DataFrame) -> pd.DataFrame:
+    compute_features.rows += len(df)
+    return pd.DataFrame({"area_per_room": df["area"] / df["rooms"],
+                         "floor_ratio": df["floor"] / df["max_floor"]}, index=df.index)
+
+
+def test_only_new_rows_are_computed_on_the_next_snapshot(tmp_path):
+    first = synthetic.listings(100, seed=0)
+    compute_features.rows = 0
+    FeatureCache(tmp_path, "code" * 8).derive(first, compute_features, "first")
+    assert compute_features.rows == 100
+
+    # The next snapshot keeps 60 listings, adds 40 and comes in a different order.
+    second = pd.concat([first.iloc[40:], synthetic.listings(40, seed=1)], ignore_index=True)
+    second = second.sample(frac=1, random_state=0)
+    compute_features.rows = 0
+    derived = FeatureCache(tmp_path, "code" * 8).derive(second, compute_features, "second")
+    assert compute_features.rows == 40
+
+    expected = compute_features(second)
+    pd.testing.assert_frame_equal(derived, expected)
+
+
+def test_a_new_code_key_starts_an_empty_cache(tmp_path):
+    df = synthetic.listings(50)
+    FeatureCache(tmp_path, "a" * 32).derive(df, compute_features, "first")
+    compute_features.rows = 0
+    FeatureCache(tmp_path, "b" * 32).derive(df, compute_features, "first")
+    assert compute_features.rows == 50
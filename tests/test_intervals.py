@@ -0,0 +1,31 @@
+import numpy as np
+import intervals
+
+
+def test_conformal_quantile_takes_the_corrected_order_statistic():
+    values = np.random.default_rng(0).permutation(np.arange(1, 20, dtype=np.float64))
+    # ceil((19 + 1) * 0.9) = 18, so the 18th smallest of 1..19.
+    assert intervals._conformal_quantile(values, 0.9) == 18
+    assert intervals._conformal_quantile(values, 0.5) == 10
+    assert intervals._conformal_quantile(values, 0.99) == 19
+
+
+def test_intervals_cover_the_requested_share_of_a_new_split():
+    rng = np.random.default_rng(0)
+    y_pred = rng.uniform(11, 13, 20000)
+    # Residuals widen with the prediction, so each bin needs its own offsets.
+    y_true = y_pred + rng.normal(0, 0.05 * (y_pred - 10), len(y_pred))
+    spec = intervals.fit(y_true[:10000], y_pred[:10000], coverage=0.9, bins=5)
+    assert len(spec["edges"]) == 4
+    assert spec["upper"][-1] > spec["upper"][0]
+
+    result = intervals.evaluate(spec, y_true[10000:], y_pred[10000:])
+    assert abs(result["coverage"] - 0.9) < 0.02
+
+
+def test_small_splits_fall_back_to_a_single_bin():
+    rng = np.random.default_rng(1)
+    y_pred = rng.uniform(11, 13, 300)
+    spec = intervals.fit(y_pred + rng.normal(0, 0.1, 300), y_pred, bins=5)
+    assert spec["edges"] == [] and len(spec["lower"]) == 1
+    assert spec["lower"][0] < 0 < spec["upper"][0]
@@ -0,0 +1,33 @@
+import synthetic
+from listingstore import ListingStore
+
+
+def test_upserting_the_same_scrape_twice_keeps_one_row_per_listing(tmp_path):
+    listings = synthetic.listings(200)
+    with ListingStore(tmp_path / "listings.db") as store:
+        store.upsert(listings, "2024-01-01")
+        repriced = listings.assign(price=listings["price"] + 1000)
+        store.upsert(repriced, "2024-01-01")
+
+        assert store.snapshot_count() == 200
+        stored = store.query().set_index("listing_id").loc[listings["listing_id"]]
+        assert (stored["price"].to_numpy() == repriced["price"].to_numpy()).all()
+
+
+def test_query_returns_the_latest_snapshot_and_new_only_skips_earlier_listings(tmp_path):
+    listings = synthetic.listings(100)
+    with ListingStore(tmp_path / "listings.db") as store:
+        store.upsert(listings, "2024-01-01")
+        store.upsert(listings.iloc[:50].assign(price=1), "2024-02-01")
+        store.upsert(synthetic.listings(130).iloc[100:], "2024-02-01")
+
+        assert store.count() == 130
+        assert store.snapshot_count() == 180
+        latest = store.query()
+        assert latest["listing_id"].is_unique and len(latest) == 130
+        assert (latest.set_index("listing_id").loc[listings["listing_id"][:50], "price"] == 1).all()
+
+        data = store.query(end="2024-02-01")
+        oot = store.query(start="2024-02-01", new_only=True)
+        assert len(data) == 100 and len(oot) == 30
+        assert set(data["listing_id"]).isdisjoint(oot["listing_id"])
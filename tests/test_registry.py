@@ -0,0 +1,60 @@
+import json
+import pytest
+import shutil
+import synthetic
+from pathlib import Path
+from predict import INPUT_COLUMNS
+from registry import SHADOW_LOG, LivePredictor, ModelRegistry, resolve_model_path
+
+BUNDLE_PATH = Path(__file__).resolve().parent.parent / "models" / "bundle"
+
+
+def make_bundle(folder: Path, version: str) -> Path:
+    path = folder / version
+    shutil.copytree(BUNDLE_PATH, path)
+    manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+    (path / "manifest.json").write_text(json.dumps({**manifest, "version": version}), encoding="utf-8")
+    return path
+
+
+def test_hot_swap_and_shadow_promotion(tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    registry.publish(make_bundle(tmp_path, "v1"))
+    assert registry.pointers()["active"] == "v1"
+    assert resolve_model_path(registry.path) == registry.version_path("v1")
+
+    rows = synthetic.listings(20)[INPUT_COLUMNS]
+    live = LivePredictor(registry.path, reload_interval=0)
+    try:
+        assert live.version == "v1" and live.shadow is None
+        before = live.current
+
+        registry.publish(make_bundle(tmp_path, "v2"), shadow=True)
+        assert live.reload()
+        assert live.current is before and live.shadow.version == "v2"
+        live.predict_many(rows)
+        live.predict(rows.iloc[0].to_dict())
+
+        # Promoting the shadow reuses its loaded predictor instead of loading the bundle again.
+        shadow = live.shadow
+        registry.activate("v2")
+        assert (registry.pointers()["active"], registry.pointers()["shadow"]) == ("v2", None)
+        assert live.reload()
+        assert live.current is shadow and live.shadow is None
+        assert not live.reload()
+    finally:
+        live.close()
+
+    with open(registry.path / SHADOW_LOG, "r", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert sum(record["rows"] for record in records) == 21
+    assert all(record["active"] == "v1" and record["shadow"] == "v2" for record in records)
+    assert all(record["max_abs_pct"] == 0 for record in records)
+
+
+def test_pointers_only_name_published_versions(tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    registry.publish(make_bundle(tmp_path, "v1"))
+    with pytest.raises(ValueError):
+        registry.activate("v9")
+    assert registry.pointers()["active"] == "v1"
@@ -0,0 +1,32 @@
+import pandas as pd
+import score
+import synthetic
+from pathlib import Path
+
+MODEL_PATH = str(Path(__file__).resolve().parent.parent / "models" / "bundle")
+
+
+def test_resumed_run_matches_single_pass(tmp_path, capsys):
+    input_path = tmp_path / "listings.csv"
+    synthetic.listings(250).to_csv(input_path, index=False)
+    scorer = score.BulkScorer(MODEL_PATH, chunk_size=100)
+
+    single = scorer.score(input_path, tmp_path / "single.csv")
+
+    # An interrupted run leaves the first chunk in the parts folder.
+    resumed_path = tmp_path / "resumed.csv"
+    parts_dir = tmp_path / "resumed.csv.parts"
+    parts_dir.mkdir()
+    score._init_worker(MODEL_PATH)
+    first = next(score.read_chunks(input_path, 100))
+    score._score_chunk(first, parts_dir / "part-000000.csv")
+
+    scorer.score(input_path, resumed_path)
+    out = capsys.readouterr().out
+    assert "Resuming: 1 chunks already scored" in out
+    assert "Scored 150 rows" in out
+    assert not parts_dir.exists()
+
+    expected = pd.read_csv(single)
+    assert len(expected) == 250
+    pd.testing.assert_frame_equal(pd.read_csv(resumed_path), expected)